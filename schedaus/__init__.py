@@ -0,0 +1,2 @@
+# bumped whenever the rendered output changes, since it is a part of the ETags
+__version__ = "1.1"
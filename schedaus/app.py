@@ -1,22 +1,75 @@
 import os
-import io
 import logging
-import yaml
 from traceback import format_exc
 
-import cairosvg
-from flask import Flask, request, make_response, send_from_directory, send_file
-from schedaus.utils import decode_base64url
-from schedaus.parse import Parser
-from schedaus.normalize import Normalizer
-from schedaus.proc import Resolver
+from flask import Flask, request, make_response, send_from_directory, jsonify
+from schedaus import pipeline
+from schedaus.utils import decode_base64url, strpdate
 from schedaus.render import Renderer
-from schedaus.cache import ResponseCache
+from schedaus.cache import ResponseCache, RenderCache, ModelCache, DiskModelCache, CalendarCache, create_backend
+from schedaus.raster import Rasterizer
+from schedaus.batch import BatchRenderer, BatchError
+from schedaus.session import SessionStore
+from schedaus.proc import ResolvePool
 logging.basicConfig(format="[%(asctime)-15s] %(name)s %(message)s")
 logger = logging.getLogger(__name__)
 
 app = Flask('schedaus')
-response_cache = ResponseCache()
+svg_backend = os.environ.get('SCHEDAUS_SVG_BACKEND', 'svgwrite')
+response_cache = ResponseCache(backend=create_backend(
+    os.environ.get('SCHEDAUS_RESPONSE_CACHE_BACKEND', 'memory'),
+    path=os.environ.get('SCHEDAUS_RESPONSE_CACHE_PATH'),
+    max_entries=int(os.environ.get('SCHEDAUS_RESPONSE_CACHE_ENTRIES', '1024')),
+    max_bytes=int(os.environ.get('SCHEDAUS_RESPONSE_CACHE_BYTES', str(64 * 1024 * 1024))),
+    slot_bytes=int(os.environ.get('SCHEDAUS_RESPONSE_CACHE_SLOT_BYTES', '0')) or None,
+))
+render_cache = RenderCache(
+    max_entries=int(os.environ.get('SCHEDAUS_RENDER_CACHE_ENTRIES', '256')),
+    max_bytes=int(os.environ.get('SCHEDAUS_RENDER_CACHE_BYTES', str(64 * 1024 * 1024))),
+)
+rasterizer = Rasterizer(
+    max_workers=int(os.environ.get('SCHEDAUS_PNG_WORKERS', '2')),
+    max_queue=int(os.environ.get('SCHEDAUS_PNG_QUEUE', '8')),
+    timeout=float(os.environ.get('SCHEDAUS_PNG_TIMEOUT', '30')),
+    cache=RenderCache(
+        max_entries=int(os.environ.get('SCHEDAUS_PNG_CACHE_ENTRIES', '256')),
+        max_bytes=int(os.environ.get('SCHEDAUS_PNG_CACHE_BYTES', str(64 * 1024 * 1024))),
+    ),
+)
+resolve_parallel_threshold = os.environ.get('SCHEDAUS_RESOLVE_PARALLEL_THRESHOLD')
+resolve_pool = None if not resolve_parallel_threshold else ResolvePool(
+    int(resolve_parallel_threshold),
+    max_workers=int(os.environ.get('SCHEDAUS_RESOLVE_WORKERS', '2')),
+)
+model_disk_cache_dir = os.environ.get('SCHEDAUS_MODEL_DISK_CACHE_DIR')
+model_cache = ModelCache(
+    max_entries=int(os.environ.get('SCHEDAUS_MODEL_CACHE_ENTRIES', '32')),
+    disk=None if not model_disk_cache_dir else DiskModelCache(
+        model_disk_cache_dir,
+        max_entries=int(os.environ.get('SCHEDAUS_MODEL_DISK_CACHE_ENTRIES', '4096')),
+    ),
+)
+tile_cache = RenderCache(
+    max_entries=int(os.environ.get('SCHEDAUS_TILE_CACHE_ENTRIES', '4096')),
+    max_bytes=int(os.environ.get('SCHEDAUS_TILE_CACHE_BYTES', str(64 * 1024 * 1024))),
+)
+calendar_cache = CalendarCache(
+    max_entries=int(os.environ.get('SCHEDAUS_CALENDAR_CACHE_ENTRIES', '64')),
+    max_bytes=int(os.environ.get('SCHEDAUS_CALENDAR_CACHE_BYTES', str(16 * 1024 * 1024))),
+)
+sessions = SessionStore(
+    max_entries=int(os.environ.get('SCHEDAUS_SESSION_ENTRIES', '256')),
+    expire_min=float(os.environ.get('SCHEDAUS_SESSION_EXPIRE_MIN', '5')),
+    calendar_cache=calendar_cache,
+    resolve_pool=resolve_pool,
+)
+batch_renderer = BatchRenderer(
+    render_cache,
+    rasterizer,
+    backend=svg_backend,
+    max_workers=int(os.environ.get('SCHEDAUS_BATCH_WORKERS', '2')),
+    max_items=int(os.environ.get('SCHEDAUS_BATCH_MAX_ITEMS', '100')),
+)
 
 
 @app.route('/sch/svg/<b64_data>')
@@ -39,57 +92,170 @@ def yaml_to_png(b64_data):
     return process_yaml(b64_data, output_svg=False)
 
 
+@app.route('/sch/tile/<any(svg, png):fmt>/<int:z>/<int:col>/<int:row>/<b64_data>')
+def sch_to_tile(fmt, z, col, row, b64_data):
+    return process_tile(b64_data, "sch", fmt == "svg", z, col, row)
+
+
+@app.route('/yaml/tile/<any(svg, png):fmt>/<int:z>/<int:col>/<int:row>/<b64_data>')
+def yaml_to_tile(fmt, z, col, row, b64_data):
+    return process_tile(b64_data, "yaml", fmt == "svg", z, col, row)
+
+
 def process_sch(b64_data, output_svg=True):
-    data_sch = decode_base64url(b64_data)
-    logger.debug(data_sch)
-    p = Parser()
-    p.parse(data_sch)
-    n = Normalizer()
-    n.normalize(p.output)
-    renderer = resolve_render(p.output)
+    return process(b64_data, "sch", output_svg)
+
+
+def process_yaml(b64_data, output_svg):
+    return process(b64_data, "yaml", output_svg)
+
+
+def process(b64_data, source_type, output_svg):
+    global render_cache, response_cache, rasterizer, calendar_cache, model_cache, sessions, resolve_pool
+
+    source = decode_base64url(b64_data)
+    logger.debug(source)
+
+    window = get_window()
+    # the keys of the whole charts stay the same as before windows
+    window_key = [] if window is None else [window]
+    svg_key = RenderCache.make_etag(source_type, source, "svg", *window_key)
     if output_svg:
-        return make_svg_response(renderer.get_svg().tostring())
+        etag = svg_key
     else:
-        return make_png_response(renderer.get_svg().tostring())
+        scale = get_png_scale()
+        etag = RenderCache.make_etag(source_type, source, "png", scale, *window_key)
 
+    # the output of live-editing clients is always rendered to keep the fallback up to date
+    client_id = request.args.get('client_id')
+    svg = None
+    if client_id is None:
+        if request.if_none_match.contains(etag):
+            return make_not_modified_response(etag)
+        svg = render_cache.get(svg_key)
+
+    patch = None
+    revision = None
+    if svg is None:
+        if client_id and window is None:
+            # live-editing clients re-render only the rows changed since their last request
+            svg, patch, revision = sessions.get(client_id).update(pipeline.load(source, source_type), request.args.get('revision'))
+            svg = svg.encode()
+        else:
+            svg = pipeline.render_svg(source, source_type, svg_backend, window, calendar_cache, model_cache, resolve_pool)
+        if client_id:
+            response_cache.set(client_id, svg)
+        render_cache.set(svg_key, svg)
+
+    if output_svg and revision is not None and request.args.get('patch') == '1':
+        # the whole svg when the patch can not be applied to the client's
+        resp = jsonify({"revision": revision, "patch": patch, "svg": None if patch is not None else svg.decode()})
+        add_cache_header(resp)
+        return resp
 
-def process_yaml(b64_data, output_svg):
-    data_yaml = decode_base64url(b64_data)
-    logger.debug(data_yaml)
-    data_dict = yaml.safe_load(data_yaml)
-    n = Normalizer()
-    n.normalize(data_dict)
-    renderer = resolve_render(data_dict)
     if output_svg:
-        return make_svg_response(renderer.get_svg().tostring())
+        body = svg
     else:
-        return make_png_response(renderer.get_svg().tostring())
+        body = rasterizer.to_png(svg, scale)
 
+    return make_output_response(body, output_svg, etag)
 
-def resolve_render(data_yaml):
-    global response_cache
 
-    data = Resolver().resolve(data_yaml)
-    renderer = Renderer()
-    renderer.render(data)
-    if request.args.get('client_id'):
-        response_cache.set(request.args.get('client_id'), renderer.get_svg())
+@app.route('/batch', methods=['POST'])
+def batch():
+    global batch_renderer
+
+    items = request.get_json(force=True, silent=True)
+    try:
+        results = batch_renderer.render(items, get_png_scale())
+    except BatchError as e:
+        resp = jsonify({"error": str(e)})
+        resp.status_code = 400
+        return resp
+
+    resp = jsonify(results)
+    add_cache_header(resp)
+    return resp
+
 
-    return renderer
+def process_tile(b64_data, source_type, output_svg, z, col, row):
+    global model_cache, tile_cache, rasterizer, calendar_cache, resolve_pool
 
+    source = decode_base64url(b64_data)
 
-def make_svg_response(svg_text):
+    svg_key = RenderCache.make_etag(source_type, source, "tile", z, col, row)
+    if output_svg:
+        etag = svg_key
+    else:
+        scale = get_png_scale()
+        etag = RenderCache.make_etag(source_type, source, "tile", z, col, row, "png", scale)
+
+    if request.if_none_match.contains(etag):
+        return make_not_modified_response(etag)
+
+    svg = tile_cache.get(svg_key)
+    if svg is None:
+        svg = pipeline.render_tile_svg(source, source_type, z, col, row, svg_backend, model_cache, calendar_cache, resolve_pool)
+        tile_cache.set(svg_key, svg)
+
+    if output_svg:
+        body = svg
+    else:
+        body = rasterizer.to_png(svg, scale)
+
+    return make_output_response(body, output_svg, etag)
+
+
+def get_window():
+    """Return the (from, to) dates of the `from` and `to` query parameters, or None."""
+    start = request.args.get('from')
+    end = request.args.get('to')
+    if start is None and end is None:
+        return None
+    return (strpdate(start), strpdate(end))
+
+
+def get_png_scale():
+    return float(os.environ.get('SCHEDAUS_PNG_SCALE', '1.8'))
+
+
+def make_output_response(body, output_svg, etag=None):
+    if output_svg:
+        return make_svg_response(body, etag)
+    else:
+        return make_png_response(body, etag)
+
+
+def make_svg_response(svg_text, etag=None):
     resp = make_response(svg_text)
-    add_common_header(resp)
+    add_common_header(resp, etag)
+    return resp
+
+
+def make_png_response(png_bytes, etag=None):
+    resp = make_response(png_bytes)
+    resp.headers['Content-Type'] = "image/png"
+    add_cache_header(resp, etag)
     return resp
 
 
-def make_png_response(svg_text):
-    scale = float(os.environ.get('SCHEDAUS_PNG_SCALE', '1.8'))
-    byteio = io.BytesIO()
-    cairosvg.svg2png(bytestring=svg_text.encode(), write_to=byteio, scale=scale)
-    byteio.seek(0)
-    return send_file(byteio, attachment_filename='schedaus.png', mimetype='image/png')
+def make_not_modified_response(etag):
+    resp = make_response("", 304)
+    add_cache_header(resp, etag)
+    return resp
+
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        "render_cache": render_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "png_cache": rasterizer.stats(),
+        "model_cache": model_cache.stats(),
+        "tile_cache": tile_cache.stats(),
+        "calendar_cache": calendar_cache.stats(),
+        "sessions": sessions.stats(),
+    })
 
 
 @app.route('/favicon.ico')
@@ -105,22 +271,31 @@ def log_exception(exc):
     logger.error(format_exc())
 
     client_id = request.args.get('client_id')
-    if client_id and response_cache.get(client_id):
-        svg = response_cache.get(client_id).copy()
-        renderer = Renderer(svg)
-        renderer.add_error()
+    last_svg = response_cache.get(client_id) if client_id else None
+    renderer = Renderer(backend=svg_backend)
+    if last_svg is not None:
+        svg_text = renderer.add_error(last_svg.decode())
     else:
-        renderer = Renderer()
         renderer.draw_error()
+        svg_text = renderer.get_svg().tostring()
 
-    resp = make_response(renderer.get_svg().tostring())
+    resp = make_response(svg_text)
     add_common_header(resp)
     return resp
 
 
-def add_common_header(resp):
+def add_common_header(resp, etag=None):
     resp.headers['Content-Type'] = "image/svg+xml; charset=utf-8"
-    resp.headers['Cache-Control'] = "no-store"
+    add_cache_header(resp, etag)
+
+
+def add_cache_header(resp, etag=None):
+    if etag is None:
+        resp.headers['Cache-Control'] = "no-store"
+    else:
+        # the same source always renders the same image, so let clients revalidate by ETag
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = "no-cache"
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+from schedaus import pipeline
+from schedaus.cache import RenderCache
+from schedaus.pool import ProcessPool
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchRenderer:
+    """Render a list of charts in one go.
+
+    Each item is a dict of `format` ("svg" or "png"), `source_type` ("sch" or
+    "yaml") and `source`. A source appearing more than once, in either format,
+    is rendered once. The svg images are rendered on a pool of `max_workers`
+    processes and the png images are rasterized by `rasterizer`.
+    `max_workers=0` renders in the calling thread.
+    """
+
+    formats = ["svg", "png"]
+    source_types = ["sch", "yaml"]
+
+    def __init__(self, render_cache, rasterizer, backend="svgwrite", max_workers=2, max_items=100):
+        self.render_cache = render_cache
+        self.rasterizer = rasterizer
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_items = max_items
+        self.pool = ProcessPool(max_workers)
+
+    def validate(self, items):
+        if not isinstance(items, list):
+            raise BatchError("the request must be a list of items")
+        if len(items) > self.max_items:
+            raise BatchError(f"too many items (max: {self.max_items})")
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise BatchError(f"item {i} is not an object")
+            if item.get("format") not in self.formats:
+                raise BatchError(f"item {i}: format must be one of {', '.join(self.formats)}")
+            if item.get("source_type") not in self.source_types:
+                raise BatchError(f"item {i}: source_type must be one of {', '.join(self.source_types)}")
+            if not isinstance(item.get("source"), str):
+                raise BatchError(f"item {i}: source must be a string")
+
+    def render(self, items, scale):
+        """Return the results in the order of `items`.
+
+        A result is a dict of `format`, `etag` and `data` (svg text, or base64
+        of png), or a dict of `error` when the item could not be rendered.
+        """
+        self.validate(items)
+
+        svg_keys = [RenderCache.make_etag(item["source_type"], item["source"], "svg") for item in items]
+        svgs = self._render_svgs(items, svg_keys)
+        pngs = self._rasterize(items, svg_keys, svgs, scale)
+
+        results = []
+        for item, svg_key in zip(items, svg_keys):
+            svg = svgs[svg_key]
+            if isinstance(svg, Exception):
+                results.append({"error": str(svg)})
+            elif item["format"] == "svg":
+                results.append({"format": "svg", "etag": svg_key, "data": svg.decode()})
+            elif isinstance(pngs[svg_key], Exception):
+                results.append({"error": str(pngs[svg_key])})
+            else:
+                results.append({
+                    "format": "png",
+                    "etag": RenderCache.make_etag(item["source_type"], item["source"], "png", scale),
+                    "data": base64.b64encode(pngs[svg_key]).decode(),
+                })
+        return results
+
+    def _render_svgs(self, items, svg_keys):
+        # svg key -> svg bytes, or the exception raised while rendering it
+        svgs = {}
+        missing = {}
+        for item, svg_key in zip(items, svg_keys):
+            if svg_key in svgs or svg_key in missing:
+                continue
+            svg = self.render_cache.get(svg_key)
+            if svg is not None:
+                svgs[svg_key] = svg
+            else:
+                missing[svg_key] = item
+
+        if self.max_workers <= 0:
+            for svg_key, item in missing.items():
+                try:
+                    svgs[svg_key] = pipeline.render_svg(item["source"], item["source_type"], self.backend)
+                except Exception as e:
+                    svgs[svg_key] = e
+        else:
+            # a worker dying fails the items on the pool, and the next item submitted starts a new one
+            futures = {}
+            for svg_key, item in missing.items():
+                try:
+                    futures[svg_key] = self.pool.submit(pipeline.render_svg, item["source"], item["source_type"], self.backend)
+                except Exception as e:
+                    svgs[svg_key] = e
+            for svg_key, future in futures.items():
+                try:
+                    svgs[svg_key] = future.result()
+                except Exception as e:
+                    svgs[svg_key] = e
+
+        for svg_key in missing:
+            if not isinstance(svgs[svg_key], Exception):
+                self.render_cache.set(svg_key, svgs[svg_key])
+        return svgs
+
+    def _rasterize(self, items, svg_keys, svgs, scale):
+        # svg key -> png bytes, or the exception raised while rasterizing it
+        targets = list(dict.fromkeys(
+            svg_key for item, svg_key in zip(items, svg_keys)
+            if item["format"] == "png" and not isinstance(svgs[svg_key], Exception)
+        ))
+        if not targets:
+            return {}
+
+        def _to_png(svg_key):
+            try:
+                return self.rasterizer.to_png(svgs[svg_key], scale)
+            except Exception as e:
+                return e
+
+        # no more images at once than the rasterizer has workers, to stay within its queue
+        with ThreadPoolExecutor(max_workers=max(1, self.rasterizer.max_workers)) as executor:
+            return dict(zip(targets, executor.map(_to_png, targets)))
@@ -1,26 +1,566 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import sqlite3
+import marshal
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+from schedaus import __version__
+from schedaus.model import dump_model, load_model
+
+logger = logging.getLogger(__name__)
+
 
 class ResponseCache:
-    def __init__(self, expire_min=5):
-        self.caches = {}
+    """The last good render (serialized svg) per client.
+
+    Entries expire `expire_min` minutes after they are set. Where the entries
+    are stored is up to the backend: MemoryBackend (default) keeps them in the
+    process, MmapBackend and SQLiteBackend keep them in a file shared by the
+    workers on the node.
+    """
+
+    def __init__(self, expire_min=5, max_entries=1024, max_bytes=64 * 1024 * 1024, backend=None):
+        if backend is None:
+            backend = MemoryBackend(max_entries, max_bytes)
+        self.backend = backend
         self.expire_min = expire_min
+        self.hits = 0
+        self.misses = 0
 
     def set(self, key, value):
-        self._check_expire()
-        self.caches[key] = (value, datetime.now() + timedelta(minutes=self.expire_min))
+        now = datetime.now()
+        self.backend.set(key, value, now + timedelta(minutes=self.expire_min), now)
 
     def get(self, key):
-        self._check_expire()
-        if key in self.caches:
-            return self.caches[key][0]
+        value = self.backend.get(key, datetime.now())
+        if value is None:
+            self.misses += 1
         else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        stats = {"hits": self.hits, "misses": self.misses}
+        stats.update(self.backend.stats())
+        return stats
+
+
+def _log_rejected(backend, size, setting):
+    # only the first value refused by a backend is logged, the others are counted in its stats
+    if backend.rejected == 1:
+        logger.warning(
+            f"a response of {size} bytes is too large for the {type(backend).__name__} of the response cache"
+            f" and is not kept for the fallback; raise {setting} to keep it"
+        )
+
+
+def create_backend(kind, path=None, max_entries=1024, max_bytes=64 * 1024 * 1024, slot_bytes=None):
+    """Create a backend of ResponseCache. `slot_bytes` of mmap is `max_bytes / max_entries` by default."""
+    if kind == "memory":
+        return MemoryBackend(max_entries, max_bytes)
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"schedaus-response-cache.{kind}")
+    if kind == "mmap":
+        return MmapBackend(path, max_entries, slot_bytes or max_bytes // max_entries)
+    if kind == "sqlite":
+        return SQLiteBackend(path, max_entries, max_bytes)
+    raise Exception(f"unsupported response cache backend: {kind}")
+
+
+class MemoryBackend:
+    """Entries in an OrderedDict in least recently used order.
+
+    get/set are amortized O(1): the expired entries are dropped from the front,
+    and the least recently used ones are evicted when the backend is over
+    `max_entries` or `max_bytes`.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.caches = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def set(self, key, value, expiration, now):
+        if self.max_entries <= 0:
+            return
+        if len(value) > self.max_bytes:
+            self.rejected += 1
+            _log_rejected(self, len(value), "SCHEDAUS_RESPONSE_CACHE_BYTES")
+            return
+
+        with self.lock:
+            self._pop(key)
+            self.caches[key] = (value, expiration)
+            self.size += len(value)
+            self._check_expire(now)
+            while len(self.caches) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self.caches)))
+                self.evictions += 1
+
+    def get(self, key, now):
+        with self.lock:
+            self._check_expire(now)
+            entry = self.caches.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                self._pop(key)
+                self.expirations += 1
+                return None
+            self.caches.move_to_end(key)
+            return entry[0]
+
+    def stats(self):
+        return {
+            "entries": len(self.caches),
+            "bytes": self.size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejected": self.rejected,
+        }
+
+    def _pop(self, key):
+        entry = self.caches.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def _expired(self, entry, now):
+        return (now - entry[1]).total_seconds() >= 0
+
+    def _check_expire(self, now):
+        while self.caches:
+            key, entry = next(iter(self.caches.items()))
+            if not self._expired(entry, now):
+                break
+            self._pop(key)
+            self.expirations += 1
+
+
+class MmapBackend:
+    """Entries in fixed-size slots of a memory-mapped file.
+
+    Every process maps the same file, so the workers forked from one master
+    share the entries. A key hashes to `probes` neighbouring slots; setting it
+    takes the slot of the same key, an empty or expired one, or else the one
+    expiring first. A value larger than a slot is not stored.
+    """
+
+    header = struct.Struct("<16sdI")
+    probes = 4
+
+    def __init__(self, path, slots=1024, slot_bytes=64 * 1024):
+        if slot_bytes <= self.header.size:
+            raise Exception(f"the slot of the response cache is too small: {slot_bytes} bytes")
+        self.path = path
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.evictions = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+        self.pid = None
+        self.fd = None
+        self.mm = None
+
+    def _open(self):
+        # descriptors inherited over fork share their flock, so map the file per process
+        if self.pid == os.getpid():
+            return
+        size = self.slots * self.slot_bytes
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                # only a new file is sized, resizing a file mapped by other
+                # processes would drop their entries or crash them
+                file_size = os.fstat(fd).st_size
+                if file_size == 0:
+                    os.ftruncate(fd, size)
+                elif file_size != size:
+                    raise Exception(
+                        f"the response cache {self.path} is {file_size} bytes, not {size} bytes of"
+                        f" {self.slots} slots of {self.slot_bytes} bytes; remove it or use the same settings"
+                    )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self.mm = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+        self.pid = os.getpid()
+
+    def _digest(self, key):
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _candidates(self, digest):
+        first = int.from_bytes(digest[0:8], "little") % self.slots
+        return [(first + i) % self.slots for i in range(min(self.probes, self.slots))]
+
+    def _read_header(self, slot):
+        return self.header.unpack_from(self.mm, slot * self.slot_bytes)
+
+    def set(self, key, value, expiration, now):
+        if len(value) > self.slot_bytes - self.header.size:
+            self.rejected += 1
+            _log_rejected(self, len(value), "SCHEDAUS_RESPONSE_CACHE_SLOT_BYTES")
+            return
+
+        digest = self._digest(key)
+        with self.lock:
+            self._open()
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                headers = [(slot, self._read_header(slot)) for slot in self._candidates(digest)]
+                victim = next((slot for slot, (d, _, _) in headers if d == digest), None)
+                if victim is None:
+                    victim = next((slot for slot, (d, e, _) in headers if d == bytes(16) or e <= now.timestamp()), None)
+                if victim is None:
+                    victim = min(headers, key=lambda h: h[1][1])[0]
+                    self.evictions += 1
+
+                offset = victim * self.slot_bytes
+                self.header.pack_into(self.mm, offset, digest, expiration.timestamp(), len(value))
+                self.mm[offset+self.header.size:offset+self.header.size+len(value)] = value
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def get(self, key, now):
+        digest = self._digest(key)
+        with self.lock:
+            self._open()
+            fcntl.flock(self.fd, fcntl.LOCK_SH)
+            try:
+                for slot in self._candidates(digest):
+                    d, e, length = self._read_header(slot)
+                    if d != digest:
+                        continue
+                    if e <= now.timestamp():
+                        return None
+                    offset = slot * self.slot_bytes + self.header.size
+                    return bytes(self.mm[offset:offset+length])
+                return None
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self.lock:
+            self._open()
+            entries = 0
+            size = 0
+            fcntl.flock(self.fd, fcntl.LOCK_SH)
+            try:
+                for slot in range(self.slots):
+                    d, _, length = self._read_header(slot)
+                    if d != bytes(16):
+                        entries += 1
+                        size += length
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "evictions": self.evictions,
+            "rejected": self.rejected,
+        }
+
+
+class SQLiteBackend:
+    """Entries in a SQLite database file shared by the processes on the node.
+
+    The least recently used entries are deleted when the database is over
+    `max_entries` or `max_bytes`.
+    """
+
+    def __init__(self, path, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+        self.local = threading.local()
+
+    def _conn(self):
+        # sqlite connections must not be shared across threads or forked processes
+        conn = getattr(self.local, "conn", None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value BLOB, expiration REAL, used REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS response_cache_expiration ON response_cache (expiration)")
+        conn.execute("CREATE INDEX IF NOT EXISTS response_cache_used ON response_cache (used)")
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    def set(self, key, value, expiration, now):
+        if self.max_entries <= 0:
+            return
+        if len(value) > self.max_bytes:
+            self.rejected += 1
+            _log_rejected(self, len(value), "SCHEDAUS_RESPONSE_CACHE_BYTES")
+            return
+
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute("DELETE FROM response_cache WHERE expiration <= ?", (now.timestamp(),))
+            self.expirations += cur.rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expiration, used) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), expiration.timestamp(), time.time()),
+            )
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM response_cache").fetchone()
+            while entries > self.max_entries or size > self.max_bytes:
+                row = conn.execute("SELECT key, LENGTH(value) FROM response_cache ORDER BY used LIMIT 1").fetchone()
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (row[0],))
+                entries -= 1
+                size -= row[1]
+                self.evictions += 1
+
+    def get(self, key, now):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM response_cache WHERE key = ? AND expiration > ?", (key, now.timestamp())
+        ).fetchone()
+        if row is None:
             return None
+        conn.execute("UPDATE response_cache SET used = ? WHERE key = ?", (time.time(), key))
+        return bytes(row[0])
 
-    def _check_expire(self):
-        now = datetime.now()
+    def stats(self):
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM response_cache"
+        ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejected": self.rejected,
+        }
+
+
+class RenderCache:
+    """LRU cache of rendered outputs (bytes) keyed by a hash of the input."""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.caches = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(str(part).encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    @staticmethod
+    def make_etag(*parts):
+        """A key of the rendered output of `parts`, which changes with `__version__` as the output does."""
+        return RenderCache.make_key(__version__, *parts)
+
+    def get(self, key):
+        with self.lock:
+            value = self.caches.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.caches.move_to_end(key)
+            self.hits += 1
+            return value
+
+    @staticmethod
+    def sizeof(value):
+        return len(value)
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self.lock:
+            old = self.caches.pop(key, None)
+            if old is not None:
+                self.size -= self.sizeof(old)
+            self.caches[key] = value
+            self.size += size
+            while len(self.caches) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.caches.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+    def stats(self):
+        return {
+            "entries": len(self.caches),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ModelCache(RenderCache):
+    """LRU cache of resolved models keyed by a hash of the source.
+
+    The models are shared by the renders reading them, so they must not be
+    modified. Only the number of entries is limited. With a `disk` cache,
+    the models missing in the memory are looked up in it, and the models set
+    are written to it too.
+    """
+
+    def __init__(self, max_entries=32, disk=None):
+        super().__init__(max_entries, max_bytes=max_entries)
+        self.disk = disk
+
+    @staticmethod
+    def sizeof(value):
+        return 1
+
+    def get(self, key):
+        value = super().get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                super().set(key, value)
+        return value
+
+    def set(self, key, value):
+        super().set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self):
+        stats = super().stats()
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class DiskModelCache:
+    """Resolved models in a SQLite database file in `directory`.
+
+    The file can be shared by the processes on the node, e.g. the replicas
+    mounting the same volume, so that a new worker starts with the models
+    resolved before. The models are stored by `dump_model`, and the keys
+    include the version of schedaus and of marshal, so the models of another
+    version are never read. The least recently used entries are deleted when
+    there are more than `max_entries`.
+    """
+
+    def __init__(self, directory, max_entries=4096):
+        self.path = os.path.join(directory, "schedaus-models.sqlite")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.local = threading.local()
+
+    def _conn(self):
+        # sqlite connections must not be shared across threads or forked processes
+        conn = getattr(self.local, "conn", None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS model_cache (key TEXT PRIMARY KEY, value BLOB, used REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS model_cache_used ON model_cache (used)")
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return RenderCache.make_key(__version__, marshal.version, key)
+
+    def get(self, key):
+        key = self._key(key)
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM model_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            model = load_model(bytes(row[0]))
+        except Exception:
+            # a broken entry is deleted and resolved again
+            conn.execute("DELETE FROM model_cache WHERE key = ?", (key,))
+            self.errors += 1
+            self.misses += 1
+            return None
+        conn.execute("UPDATE model_cache SET used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return model
+
+    def set(self, key, model):
+        try:
+            value = dump_model(model)
+        except ValueError:
+            # e.g. a yaml text parsed into a date, which marshal can not store
+            self.errors += 1
+            return
+
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO model_cache (key, value, used) VALUES (?, ?, ?)",
+                (self._key(key), sqlite3.Binary(value), time.time()),
+            )
+            entries = conn.execute("SELECT COUNT(*) FROM model_cache").fetchone()[0]
+            if entries > self.max_entries:
+                conn.execute(
+                    "DELETE FROM model_cache WHERE key IN (SELECT key FROM model_cache ORDER BY used LIMIT ?)",
+                    (entries - self.max_entries,),
+                )
+
+    def stats(self):
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM model_cache"
+        ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+class CalendarCache(RenderCache):
+    """LRU cache of the calendar layers (svg text) of the charts.
+
+    A layer is drawn down to the chart's height rounded up to `height_step`
+    pixels, and the svg clips what is under the chart, so the charts of a
+    similar number of rows share a layer.
+    """
 
-        def _not_expired(expiration):
-            return (now - expiration).total_seconds() < 0
+    def __init__(self, max_entries=64, max_bytes=16 * 1024 * 1024, height_step=512):
+        super().__init__(max_entries, max_bytes)
+        self.height_step = height_step
 
-        self.caches = {k: v for k, v in self.caches.items() if _not_expired(v[1])}
+    def height_of(self, height):
+        if self.height_step <= 0:
+            return height
+        return -(-height // self.height_step) * self.height_step
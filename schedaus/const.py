@@ -37,5 +37,8 @@ class C(metaclass=MetaConst):
     width_per_day = 8
     height_per_line = 16
 
+    tile_width = 512
+    tile_height = 512
+
     def __init__(self):
         raise ConstError("Const class can not be instantiated.")
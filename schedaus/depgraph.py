@@ -0,0 +1,126 @@
+from collections import deque
+
+
+class CycleError(Exception):
+    def __init__(self, cycle):
+        self.cycle = cycle
+        path = " -> ".join(cycle + cycle[0:1])
+        super().__init__(f"the dependencies are looped! ({path})")
+
+
+class DependencyGraph:
+    """A directed graph between the schedules.
+
+    Nodes are numbered in the order they are added, and the edges are kept as
+    lists of successor ids, so a node costs a few ints.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.successors = []
+        self.indegrees = []
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_node(self, name):
+        if name in self.ids:
+            return self.ids[name]
+        i = len(self.names)
+        self.ids[name] = i
+        self.names.append(name)
+        self.successors.append([])
+        self.indegrees.append(0)
+        return i
+
+    def add_edge(self, src, dst):
+        s = self.ids[src]
+        d = self.ids[dst]
+        if d in self.successors[s]:
+            return
+        self.successors[s].append(d)
+        self.indegrees[d] += 1
+
+    def topological_order(self):
+        """Return the node names in topological order (Kahn's algorithm).
+
+        Raises CycleError with the members of a cycle if the graph has one.
+        """
+        indegrees = list(self.indegrees)
+        queue = deque(i for i, n in enumerate(indegrees) if n == 0)
+        order = []
+        while queue:
+            i = queue.popleft()
+            order.append(self.names[i])
+            for j in self.successors[i]:
+                indegrees[j] -= 1
+                if indegrees[j] == 0:
+                    queue.append(j)
+
+        if len(order) != len(self.names):
+            raise CycleError(self._find_cycle(indegrees))
+
+        return order
+
+    def descendants(self, names):
+        """Return the set of the nodes reachable from `names`, including themselves."""
+        seen = {self.ids[n] for n in names if n in self.ids}
+        stack = list(seen)
+        while stack:
+            for j in self.successors[stack.pop()]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        return {self.names[i] for i in seen}
+
+    def components(self):
+        """Return the weakly connected components as lists of node names.
+
+        The nodes of a component and the components themselves are in the
+        order the nodes were added.
+        """
+        parents = list(range(len(self.names)))
+
+        def _root(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for i, successors in enumerate(self.successors):
+            for j in successors:
+                ri = _root(i)
+                rj = _root(j)
+                if ri != rj:
+                    parents[max(ri, rj)] = min(ri, rj)
+
+        components = {}
+        for i, name in enumerate(self.names):
+            components.setdefault(_root(i), []).append(name)
+        return list(components.values())
+
+    def _find_cycle(self, indegrees):
+        # Every node left unsorted has an unsorted predecessor, so walking
+        # backwards from any of them must run into a cycle.
+        predecessors = {}
+        for i, n in enumerate(indegrees):
+            if n == 0:
+                continue
+            for j in self.successors[i]:
+                if indegrees[j] > 0:
+                    predecessors[j] = i
+
+        i = next(iter(predecessors))
+        visited = {}
+        walk = []
+        while i not in visited:
+            visited[i] = len(walk)
+            walk.append(i)
+            i = predecessors[i]
+
+        cycle = walk[visited[i]:]
+        return [self.names[j] for j in reversed(cycle)]
@@ -1,5 +1,8 @@
-from dataclasses import dataclass
-from typing import Optional, List
+import sys
+import zlib
+import marshal
+from dataclasses import FrozenInstanceError, dataclass, fields, replace
+from typing import List
 from datetime import date
 
 
@@ -12,47 +15,243 @@ class Calendar:
     scale: str
 
 
-@dataclass
-class Task:
-    name: str
-    text: str
-    plan_start: date
-    plan_end: date
-    color_plan_fill: str
-    color_plan_outline: str
-    color_actual_fill: str
-    color_actual_outline: str
-    color_text: str
-    actual_start: Optional[date] = None
-    actual_completed: Optional[date] = None
-    actual_progress: Optional[str] = None
-    actual_end: Optional[date] = None
-    assignee: Optional[str] = None
+# the ordinals shared by the dates of the schedules, as a chart spans a limited range of days
+_ordinals = {}
 
 
-@dataclass
-class Milestone:
-    name: str
-    text: str
-    plan_happen: date
-    color_plan_fill: str
-    color_plan_outline: str
-    color_actual_fill: str
-    color_actual_outline: str
-    color_text: str
-    actual_happen: Optional[date] = None
-
-
-@dataclass(frozen=True)
-class DependencyPath:
-    start_name: str
-    start_date: date
-    end_name: str
-    end_date: date
-    color: str
+def _to_ordinal(d):
+    if type(d) is not date:
+        return d
+    o = d.toordinal()
+    found = _ordinals.get(o)
+    if found is None:
+        if len(_ordinals) >= 65536:
+            _ordinals.clear()
+        found = _ordinals[o] = o
+    return found
 
 
-@dataclass
-class Group:
-    text: str
-    member: List[str]
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+
+# the color sets shared by the schedules:
+# (plan fill, plan outline, actual fill, actual outline, text)
+_palette = {}
+
+
+def _color_set(colors):
+    found = _palette.get(colors)
+    if found is None:
+        if len(_palette) >= 1024:
+            _palette.clear()
+        found = _palette[colors] = tuple(_intern(c) for c in colors)
+    return found
+
+
+def _date_slot(slot):
+    # a date attribute kept as an ordinal in `slot`
+    def _get(self):
+        v = getattr(self, slot)
+        return date.fromordinal(v) if type(v) is int else v
+
+    def _set(self, v):
+        setattr(self, slot, _to_ordinal(v))
+
+    return property(_get, _set)
+
+
+def _color_slot(i):
+    # a color attribute kept in the shared color set
+    def _get(self):
+        return self._colors[i]
+
+    def _set(self, v):
+        colors = list(self._colors)
+        colors[i] = v
+        self._colors = _color_set(tuple(colors))
+
+    return property(_get, _set)
+
+
+class _Record:
+    """The base of the slotted models, compared and printed by `_fields` like dataclasses.
+
+    A chart can have tens of thousands of schedules, so they have no
+    `__dict__` and share what they can: the dates are kept as shared
+    ordinals, the colors as a shared color set, and the texts and the
+    assignees are interned. The names are unique, so they are not.
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _date_fields = ()
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self._fields)
+
+    def __repr__(self):
+        values = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{type(self).__name__}({values})"
+
+
+class Task(_Record):
+    __slots__ = (
+        "name", "text", "_plan_start", "_plan_end", "_colors", "_actual_start",
+        "_actual_completed", "actual_progress", "_actual_end", "assignee",
+    )
+    _fields = (
+        "name", "text", "plan_start", "plan_end", "color_plan_fill", "color_plan_outline",
+        "color_actual_fill", "color_actual_outline", "color_text", "actual_start",
+        "actual_completed", "actual_progress", "actual_end", "assignee",
+    )
+    _date_fields = ("plan_start", "plan_end", "actual_start", "actual_completed", "actual_end")
+
+    def __init__(self, name, text, plan_start, plan_end, color_plan_fill, color_plan_outline,
+                 color_actual_fill, color_actual_outline, color_text, actual_start=None,
+                 actual_completed=None, actual_progress=None, actual_end=None, assignee=None):
+        self.name = name
+        self.text = _intern(text)
+        self._plan_start = _to_ordinal(plan_start)
+        self._plan_end = _to_ordinal(plan_end)
+        self._colors = _color_set((color_plan_fill, color_plan_outline, color_actual_fill, color_actual_outline, color_text))
+        self._actual_start = _to_ordinal(actual_start)
+        self._actual_completed = _to_ordinal(actual_completed)
+        self.actual_progress = actual_progress
+        self._actual_end = _to_ordinal(actual_end)
+        self.assignee = _intern(assignee)
+
+    plan_start = _date_slot("_plan_start")
+    plan_end = _date_slot("_plan_end")
+    actual_start = _date_slot("_actual_start")
+    actual_completed = _date_slot("_actual_completed")
+    actual_end = _date_slot("_actual_end")
+    color_plan_fill = _color_slot(0)
+    color_plan_outline = _color_slot(1)
+    color_actual_fill = _color_slot(2)
+    color_actual_outline = _color_slot(3)
+    color_text = _color_slot(4)
+
+
+class Milestone(_Record):
+    __slots__ = ("name", "text", "_plan_happen", "_colors", "_actual_happen")
+    _fields = (
+        "name", "text", "plan_happen", "color_plan_fill", "color_plan_outline",
+        "color_actual_fill", "color_actual_outline", "color_text", "actual_happen",
+    )
+    _date_fields = ("plan_happen", "actual_happen")
+
+    def __init__(self, name, text, plan_happen, color_plan_fill, color_plan_outline,
+                 color_actual_fill, color_actual_outline, color_text, actual_happen=None):
+        self.name = name
+        self.text = _intern(text)
+        self._plan_happen = _to_ordinal(plan_happen)
+        self._colors = _color_set((color_plan_fill, color_plan_outline, color_actual_fill, color_actual_outline, color_text))
+        self._actual_happen = _to_ordinal(actual_happen)
+
+    plan_happen = _date_slot("_plan_happen")
+    actual_happen = _date_slot("_actual_happen")
+    color_plan_fill = _color_slot(0)
+    color_plan_outline = _color_slot(1)
+    color_actual_fill = _color_slot(2)
+    color_actual_outline = _color_slot(3)
+    color_text = _color_slot(4)
+
+
+class DependencyPath(_Record):
+    __slots__ = ("start_name", "_start_date", "end_name", "_end_date", "color")
+    _fields = ("start_name", "start_date", "end_name", "end_date", "color")
+    _date_fields = ("start_date", "end_date")
+
+    def __init__(self, start_name, start_date, end_name, end_date, color):
+        # frozen like the dataclass it was, since it is hashed by its fields
+        object.__setattr__(self, "start_name", _intern(start_name))
+        object.__setattr__(self, "_start_date", _to_ordinal(start_date))
+        object.__setattr__(self, "end_name", _intern(end_name))
+        object.__setattr__(self, "_end_date", _to_ordinal(end_date))
+        object.__setattr__(self, "color", _intern(color))
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __reduce__(self):
+        # pickle and copy set the slots by setattr, which is refused
+        return (DependencyPath, (self.start_name, self.start_date, self.end_name, self.end_date, self.color))
+
+    def __hash__(self):
+        return hash((self.start_name, self._start_date, self.end_name, self._end_date, self.color))
+
+    start_date = _date_slot("_start_date")
+    end_date = _date_slot("_end_date")
+
+
+class Group(_Record):
+    __slots__ = ("text", "member")
+    _fields = ("text", "member")
+
+    def __init__(self, text, member):
+        self.text = text
+        self.member = member
+
+
+# the field names of each model class, and the ones holding dates
+_fields = {Calendar: [f.name for f in fields(Calendar)]}
+_dates = {Calendar: {f.name for f in fields(Calendar) if f.type is date}}
+for _cls in [Task, Milestone, DependencyPath]:
+    _fields[_cls] = _cls._fields
+    _dates[_cls] = set(_cls._date_fields)
+
+
+def _to_tuple(obj):
+    dates = _dates[type(obj)]
+    values = []
+    for name in _fields[type(obj)]:
+        v = getattr(obj, name)
+        if name in dates and isinstance(v, date):
+            v = v.toordinal()
+        values.append(v)
+    return tuple(values)
+
+
+def _from_tuple(cls, values):
+    dates = _dates[cls]
+    return cls(*[
+        date.fromordinal(v) if name in dates and isinstance(v, int) else v
+        for name, v in zip(_fields[cls], values)
+    ])
+
+
+def dump_model(model):
+    """Serialize a resolved model into bytes.
+
+    The models are turned into tuples with the dates as ordinals, and the
+    tuples are marshaled and compressed. Raises ValueError if the model
+    holds a value marshal does not support.
+    """
+    calendar = model["calendar"]
+    payload = (
+        _to_tuple(replace(calendar, closed=[d.toordinal() for d in calendar.closed])),
+        [("task" if isinstance(sc, Task) else "milestone", _to_tuple(sc)) for sc in model["schedules"]],
+        [_to_tuple(dpath) for dpath in model["dependency_paths"]],
+        [(g.text, g.member) for g in model["groups"]],
+    )
+    return zlib.compress(marshal.dumps(payload))
+
+
+def load_model(data):
+    """Deserialize the bytes of `dump_model` into a resolved model."""
+    calendar, schedules, dpaths, groups = marshal.loads(zlib.decompress(data))
+    calendar = _from_tuple(Calendar, calendar)
+    calendar.closed = [date.fromordinal(o) for o in calendar.closed]
+    classes = {"task": Task, "milestone": Milestone}
+    return {
+        "calendar": calendar,
+        "schedules": [_from_tuple(classes[kind], values) for kind, values in schedules],
+        "dependency_paths": [_from_tuple(DependencyPath, values) for values in dpaths],
+        "groups": [Group(text, member) for text, member in groups],
+    }
@@ -1,6 +1,7 @@
 from datetime import date
 
 from schedaus.const import C
+from schedaus.utils import strpdate
 
 
 class Normalizer:
@@ -24,13 +25,63 @@ class Normalizer:
             return f(value)
         return value
 
+    def _date(self, value):
+        if not isinstance(value, str):
+            return value
+        try:
+            return strpdate(value)
+        except ValueError:
+            return value
+
+    def _project_start(self, value):
+        return self._date(value)
+
+    def _project_end(self, value):
+        return self._date(value)
+
+    def _project_today(self, value):
+        return self._date(value)
+
     def _project_closed_elem(self, value):
+        value = self._date(value)
+        if isinstance(value, date):
+            return value
+        if isinstance(value, str) and " to " in value:
+            # "2020/4/29 to 2020/5/6" -> (start, end)
+            start, end = [self._date(v.strip()) for v in value.split(" to ", 1)]
+            if isinstance(start, date) and isinstance(end, date):
+                return (start, end)
+            return value
         for i in range(7):
             d = date(1970, 1, 1+i)
             if d.strftime("%a").lower()[0:2] == value.lower()[0:2]:
                 return d.strftime("%A")
         return value
 
+    def _task_elem_plan_start(self, value):
+        return self._date(value)
+
+    def _task_elem_plan_end(self, value):
+        return self._date(value)
+
+    def _task_elem_actual_start(self, value):
+        return self._date(value)
+
+    def _task_elem_actual_end(self, value):
+        return self._date(value)
+
+    def _milestone_elem_plan(self, value):
+        return self._date(value)
+
+    def _milestone_elem_plan_start(self, value):
+        return self._date(value)
+
+    def _milestone_elem_plan_end(self, value):
+        return self._date(value)
+
+    def _milestone_elem_actual(self, value):
+        return self._date(value)
+
     def _task_elem_plan_period(self, value):
         if isinstance(value, float):
             return value
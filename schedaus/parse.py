@@ -1,6 +1,5 @@
 import re
 import yaml
-from datetime import timedelta
 from collections import defaultdict
 
 from schedaus.utils import strpdate, is_float, is_valid_date, is_valid_color
@@ -10,6 +9,7 @@ class ParserContext:
     def __init__(self):
         self.group = None
         self.schedule = None
+        self.registered = False
 
 
 class Parser:
@@ -38,34 +38,62 @@ class Parser:
             "group": []
         }
         self.context = ParserContext()
+        # name -> kind of the registered schedules
+        self.names = {}
 
     def parse(self, data_sch):
-        for line in data_sch.splitlines():
-            self.dispatch(line)
+        self.feed(data_sch.splitlines())
+        self.close()
 
+    def parse_file(self, path):
+        with open(path) as f:
+            self.feed(f)
+        self.close()
+
+    def feed(self, lines):
+        """Parse the lines of an iterable, e.g. a file object or a generator.
+
+        It can be called repeatedly with the following lines. Call `close()`
+        after the last lines.
+        """
+        for line in lines:
+            self.dispatch(line.rstrip("\r\n"))
+
+    def close(self):
         self.output["task"] = [dict(t) for t in self.output["task"]]
         self.output["milestone"] = [dict(m) for m in self.output["milestone"]]
 
     def dispatch(self, line):
-        patterns = [
-            "comment",
-            "project_period",
-            "ranged_holiday",
-            "holiday",
-            "today",
-            "scale",
-            "color",
-            "group",
-            "task",
-            "milestone",
-            "attribute",
-        ]
-
-        for pattern_name in patterns:
-            m = getattr(self, "re_" + pattern_name).match(line)
+        handler, m = self.match(line)
+        if handler is not None:
+            handler(self, line, m)
+
+    def match(self, line):
+        """Return the handler for the line and the match object, or (None, None)."""
+        for pattern, handler in self.dispatch_table[self._classify(line)]:
+            m = pattern.match(line)
             if m is not None:
-                getattr(self, pattern_name)(line, m)
-                return
+                return handler, m
+        return None, None
+
+    @staticmethod
+    def _classify(line):
+        # Narrow down the patterns by the first characters; the patterns which
+        # can not match the kind of line are left out of its candidates.
+        if not line:
+            return "empty"
+        c = line[0]
+        if c == "#":
+            return "comment"
+        if line.endswith("closed"):
+            return "any"
+        if c.isspace():
+            return "attribute"
+        if c == "!":
+            return "milestone"
+        if line.startswith("--") or line.startswith("=="):
+            return "group"
+        return "keyword"
 
     def comment(self, line, m):
         pass
@@ -81,13 +109,10 @@ class Parser:
 
     def ranged_holiday(self, line, m):
         try:
-            d = strpdate(m.group(1))
-            end = strpdate(m.group(2)) + timedelta(days=1)
-            if d > end:
+            if strpdate(m.group(1)) > strpdate(m.group(2)):
                 return
-            while d != end:
-                self.output["project"]["closed"].append(d.strftime("%Y/%m/%d"))
-                d += timedelta(days=1)
+            # kept as a range, the Normalizer turns it into a pair of dates
+            self.output["project"]["closed"].append(f"{m.group(1)} to {m.group(2)}")
         except ValueError:
             pass
 
@@ -124,6 +149,7 @@ class Parser:
         if m.group(3):
             task["text"] = m.group(3).strip("'\"")
         self.context.schedule = task
+        self.context.registered = False
 
     def milestone(self, line, m):
         self.task(line, m, kind="milestone")
@@ -170,13 +196,12 @@ class Parser:
         self._register_schedule()
 
     def _register_schedule(self):
+        if self.context.registered:
+            return
+
         sc = self.context.schedule
         kind = sc["kind"]
 
-        if sc["name"] in [o["name"] for o in self.output[kind]]:
-            # already registered
-            return
-
         if kind == "task":
             if "plan" not in sc:
                 return
@@ -188,13 +213,150 @@ class Parser:
             if "plan" not in sc:
                 return
 
+        if sc["name"] in self.names:
+            raise Exception(f"'{sc['name']}' is duplicated.")
+
+        self.names[sc["name"]] = kind
+        self.context.registered = True
         self.output[kind].append(sc)
         if self.context.group is not None:
             self.context.group["member"].append(sc["name"])
 
+    # candidate (pattern, handler) pairs per the kind of line, in the order they are tried
+    dispatch_table = {
+        "empty": (),
+        "comment": (
+            (re_comment, comment),
+        ),
+        "attribute": (
+            (re_attribute, attribute),
+        ),
+        "milestone": (
+            (re_milestone, milestone),
+        ),
+        "group": (
+            (re_group, group),
+        ),
+        "keyword": (
+            (re_project_period, project_period),
+            (re_today, today),
+            (re_scale, scale),
+            (re_color, color),
+            (re_task, task),
+        ),
+        "any": (
+            (re_comment, comment),
+            (re_project_period, project_period),
+            (re_ranged_holiday, ranged_holiday),
+            (re_holiday, holiday),
+            (re_today, today),
+            (re_scale, scale),
+            (re_color, color),
+            (re_group, group),
+            (re_task, task),
+            (re_milestone, milestone),
+            (re_attribute, attribute),
+        ),
+    }
+
+
+class _Block:
+    __slots__ = ("lines", "output", "inherited")
+
+    def __init__(self, lines, output, inherited):
+        self.lines = lines
+        self.output = output
+        # members registered to the group the block starts in
+        self.inherited = inherited
+
+
+class IncrementalParser:
+    """Parse a .sch source block by block, and reparse only the edited blocks.
+
+    A block starts at a task or milestone line and holds the lines until the
+    next one, so the parser context only carries the group over the block
+    boundaries. Each block is parsed on its own with a placeholder for the
+    group it starts in, and `get_output()` puts the blocks together in order.
+    """
+
+    def __init__(self, source=""):
+        self.splitter = Parser()
+        self.blocks = self._parse_blocks(source.splitlines())
+
+    @property
+    def lines(self):
+        return [line for block in self.blocks for line in block.lines]
+
+    def update(self, start, end, lines):
+        """Replace the lines [start, end) with `lines` and reparse the blocks around them."""
+        # the block ending just before the range is reparsed too, as the
+        # lines inserted there can be attributes of its schedule
+        first = last = None
+        pos = 0
+        for i, block in enumerate(self.blocks):
+            block_end = pos + len(block.lines)
+            if first is None and block_end >= start:
+                first, first_pos = i, pos
+            if block_end >= end:
+                last = i
+                break
+            pos = block_end
+        if first is None:
+            first, first_pos = len(self.blocks), pos
+        if last is None:
+            last = len(self.blocks) - 1
+
+        old = [line for block in self.blocks[first:last + 1] for line in block.lines]
+        new = old[:start - first_pos] + list(lines) + old[end - first_pos:]
+        self.blocks[first:last + 1] = self._parse_blocks(new)
+
+    def get_output(self):
+        """Return the parsed data like `Parser.output`, as a new dict on every call."""
+        output = Parser().output
+        names = {}
+        group = None
+        for block in self.blocks:
+            o = block.output
+            closed = output["project"]["closed"]
+            output["project"].update(o["project"])
+            output["project"]["closed"] = closed + o["project"]["closed"]
+            output["style"]["color"].update(o["style"]["color"])
+            if group is not None:
+                group["member"].extend(block.inherited)
+            for g in o["group"]:
+                group = {"text": g["text"], "member": list(g["member"])}
+                output["group"].append(group)
+            for kind in ["task", "milestone"]:
+                for sc in o[kind]:
+                    if sc["name"] in names:
+                        raise Exception(f"'{sc['name']}' is duplicated.")
+                    names[sc["name"]] = kind
+                    output[kind].append({k: dict(v) if isinstance(v, dict) else v for k, v in sc.items()})
+        return output
+
+    def _parse_blocks(self, lines):
+        blocks = []
+        block_lines = []
+        for line in lines:
+            handler, _ = self.splitter.match(line)
+            if handler in (Parser.task, Parser.milestone) and block_lines:
+                blocks.append(self._parse_block(block_lines))
+                block_lines = []
+            block_lines.append(line)
+        if block_lines:
+            blocks.append(self._parse_block(block_lines))
+        return blocks
+
+    def _parse_block(self, lines):
+        p = Parser()
+        inherited = {"text": None, "member": []}
+        p.context.group = inherited
+        p.feed(lines)
+        p.close()
+        return _Block(lines, p.output, inherited["member"])
+
 
 if __name__ == "__main__":
-    with open("example.sch") as f:
-        p = Parser()
-        p.parse(f.read())
-        print(yaml.dump(p.output))
+    p = Parser()
+    p.parse_file("example.sch")
+    print(yaml.dump(p.output))
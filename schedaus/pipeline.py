@@ -0,0 +1,64 @@
+import yaml
+
+from schedaus.parse import Parser
+from schedaus.normalize import Normalizer
+from schedaus.proc import Resolver
+from schedaus.render import Renderer
+from schedaus.cache import RenderCache
+
+
+def load(source, source_type):
+    """Load the source text ("sch" or "yaml") into a normalized data dict."""
+    if source_type == "sch":
+        p = Parser()
+        p.parse(source)
+        data = p.output
+    elif source_type == "yaml":
+        data = yaml.safe_load(source)
+    else:
+        raise Exception(f"unsupported source type: {source_type}")
+
+    n = Normalizer()
+    n.normalize(data)
+    return data
+
+
+def resolve(source, source_type, resolve_pool=None):
+    """Resolve the source into the model, see `Resolver` for `resolve_pool`."""
+    return Resolver(resolve_pool).resolve(load(source, source_type))
+
+
+def resolve_cached(source, source_type, cache, resolve_pool=None):
+    """Same as `resolve`, through a ModelCache. The model must not be modified."""
+    key = RenderCache.make_key(source_type, source)
+    model = cache.get(key)
+    if model is None:
+        model = resolve(source, source_type, resolve_pool)
+        cache.set(key, model)
+    return model
+
+
+def render(source, source_type, backend="svgwrite", window=None, calendar_cache=None, model_cache=None, resolve_pool=None):
+    if model_cache is None:
+        model = resolve(source, source_type, resolve_pool)
+    else:
+        model = resolve_cached(source, source_type, model_cache, resolve_pool)
+    renderer = Renderer(backend=backend, calendar_cache=calendar_cache)
+    renderer.render(model, window=window)
+    return renderer
+
+
+def render_svg(source, source_type, backend="svgwrite", window=None, calendar_cache=None, model_cache=None, resolve_pool=None):
+    """Render the source into svg bytes."""
+    renderer = render(source, source_type, backend, window, calendar_cache, model_cache, resolve_pool)
+    return renderer.get_svg().tostring().encode()
+
+
+def render_tile_svg(source, source_type, z, col, row, backend="svgwrite", model_cache=None, calendar_cache=None, resolve_pool=None):
+    """Render a tile of the source into svg bytes, see `Renderer.render_tile`."""
+    if model_cache is None:
+        model = resolve(source, source_type, resolve_pool)
+    else:
+        model = resolve_cached(source, source_type, model_cache, resolve_pool)
+    renderer = Renderer(backend=backend, calendar_cache=calendar_cache)
+    return renderer.render_tile(model, z, col, row).tostring().encode()
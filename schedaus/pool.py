@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ProcessPool:
+    """A pool of `max_workers` processes started on the first job, and replaced when broken.
+
+    When a worker dies, e.g. killed for its memory, its jobs fail with
+    `BrokenProcessPool` and the executor refuses every job from then on. The
+    next job submitted to the pool shuts such an executor down and starts a
+    new one. The jobs which failed are left to the caller.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def _discard(self, executor):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, fn, *args):
+        """Submit a job like `ProcessPoolExecutor.submit`, and return its future."""
+        executor = self._executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(executor)
+        return self._executor().submit(fn, *args)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
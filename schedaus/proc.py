@@ -1,21 +1,160 @@
+import os
 import math
+import pickle
 import logging
-from datetime import timedelta
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
 from pprint import pformat
 
-from graph import Graph
 from schedaus.const import C
+from schedaus.depgraph import DependencyGraph
 from schedaus.model import Calendar, Task, Milestone, DependencyPath, Group
-from schedaus.utils import strpdate, weekday_to_dates, calc_date_in_business_days
+from schedaus.pool import ProcessPool
+from schedaus.utils import ClosedDays, BusinessCalendar
 
 logger = logging.getLogger(__name__)
 
 
+# the Resolver of a worker process resolving components in parallel, and
+# the pickled calendar and colors it was set up with
+_worker = None
+_worker_setup = None
+
+
+def _ordinal(d):
+    return d.toordinal() if isinstance(d, date) else d
+
+
+def _date(o):
+    return date.fromordinal(o) if isinstance(o, int) else o
+
+
+def _resolve_chunk(setup, project, plans, order):
+    # The calendar and the colors are pickled once per resolve, and a worker
+    # unpickles them only when they differ from its last chunk's. Dates go
+    # back and forth as ordinals and the paths as tuples, which pickle
+    # several times faster than date and DependencyPath objects.
+    global _worker, _worker_setup
+    if setup != _worker_setup:
+        _worker = Resolver()
+        _worker.business_calendar, _worker.colors = pickle.loads(setup)
+        _worker_setup = setup
+
+    schedules = {n: {"plan": plan} for n, plan in plans.items()}
+    resolved = []
+    for n in order:
+        dpaths = _worker._resolve_node(project, schedules, n)
+        plan = schedules[n]["plan"]
+        resolved.append((
+            n,
+            _ordinal(plan.get("start")),
+            _ordinal(plan.get("end")),
+            [(p.start_name, _ordinal(p.start_date), _ordinal(p.end_date)) for p in dpaths],
+        ))
+    return resolved
+
+
+class ResolvePool(ProcessPool):
+    """A pool of worker processes resolving the dependencies of large charts.
+
+    When a chart has `threshold` schedules or more, the weakly connected
+    components of its dependency graph are resolved on `max_workers`
+    processes. The pool is started on the first such chart and shared by the
+    Resolvers given it. When a worker dies, the chart is resolved in the
+    calling process and the pool is replaced by a new one on the next chart.
+    """
+
+    def __init__(self, threshold, max_workers=None):
+        super().__init__(max_workers or os.cpu_count() or 1)
+        self.threshold = threshold
+
+    def resolve_chunks(self, setup, project, chunks):
+        """Resolve the chunks by `_resolve_chunk`, or return None if a worker died."""
+        try:
+            futures = [self.submit(_resolve_chunk, setup, project, plans, order) for plans, order in chunks]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            logger.warning("a resolving process died, resolving in this process")
+            return None
+
+
 class Resolver:
-    def __init__(self):
+    """Resolve the normalized data into the models to render.
+
+    With a `ResolvePool`, the dependencies of large charts are resolved on
+    its worker processes. None always resolves in the calling process.
+    """
+
+    def __init__(self, pool=None):
         self.colors = None
+        self.business_calendar = None
+        self.pool = pool
 
     def resolve(self, data_dict):
+        ret, project, schedules = self._prepare(data_dict)
+        ret["dependency_paths"] = self._resolve_dependency(project, schedules)
+
+        for task in data_dict.get("task", []):
+            self._resolve_actual(project, task)
+            ret["schedules"].append(self._make_task(task))
+        for ms in data_dict.get("milestone", []):
+            ret["schedules"].append(self._make_milestone(ms))
+        ret["groups"] = self._make_groups(data_dict, ret["schedules"])
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(pformat(ret))
+
+        return ret
+
+    def update(self, data_dict, previous, changed):
+        """Resolve the data like `resolve`, reusing the resolved `previous`.
+
+        `previous` is the model of the data which is the same as `data_dict`
+        except for the schedules named in `changed`. Only those schedules and
+        the ones depending on them are resolved again, and the others are
+        taken from `previous`. Returns the model and the names of the
+        schedules resolved again.
+        """
+        ret, project, schedules = self._prepare(data_dict)
+        g = self._build_graph(schedules)
+        order = g.topological_order()
+        dirty = g.descendants(changed)
+
+        previous_schedules = {sc.name: sc for sc in previous["schedules"]}
+        previous_paths = {}
+        for dpath in previous["dependency_paths"]:
+            previous_paths.setdefault(dpath.end_name, []).append(dpath)
+
+        dpaths = []
+        for n in order:
+            if n in dirty:
+                dpaths.extend(self._resolve_node(project, schedules, n))
+                continue
+            # the dependents read the resolved plan of the schedule
+            sc = previous_schedules[n]
+            if isinstance(sc, Task):
+                schedules[n] = {"plan": {"start": sc.plan_start, "end": sc.plan_end}}
+            else:
+                schedules[n] = {"plan": {"start": sc.plan_happen, "end": sc.plan_happen}}
+            dpaths.extend(previous_paths.get(n, []))
+        ret["dependency_paths"] = dpaths
+
+        for task in data_dict.get("task", []):
+            if task["name"] in dirty:
+                self._resolve_actual(project, task)
+                ret["schedules"].append(self._make_task(task))
+            else:
+                ret["schedules"].append(previous_schedules[task["name"]])
+        for ms in data_dict.get("milestone", []):
+            if ms["name"] in dirty:
+                ret["schedules"].append(self._make_milestone(ms))
+            else:
+                ret["schedules"].append(previous_schedules[ms["name"]])
+        ret["groups"] = self._make_groups(data_dict, ret["schedules"])
+
+        return ret, dirty
+
+    def _prepare(self, data_dict):
         ret = {
             "calendar": None,
             "schedules": [],
@@ -24,89 +163,86 @@ class Resolver:
         }
 
         project = data_dict["project"]
-        start = strpdate(project["start"])
-        end = strpdate(project["end"])
-        closed = []
+        start = project["start"]
+        end = project["end"]
+        closed_days = ClosedDays()
         for c in project["closed"]:
-            try:
-                d = strpdate(c)
-                closed.append(d)
-            except ValueError:
-                closed.extend(weekday_to_dates(c, start, end))
-        project["closed_dates"] = closed
+            if isinstance(c, tuple):
+                closed_days.add_range(*c)
+            elif isinstance(c, date):
+                closed_days.add_date(c)
+            else:
+                closed_days.add_weekday(c)
+        closed = closed_days.dates(start, end)
+        self.business_calendar = BusinessCalendar(start, end, closed_days)
         project["scale"] = project.get("scale", "daily")
-        ret["calendar"] = Calendar(start, end, strpdate(project["today"]), closed, project["scale"])
+        ret["calendar"] = Calendar(start, end, project["today"], closed, project["scale"])
 
         self.colors = self._get_colors(data_dict.get("style"))
 
         schedules = {}
         for task in data_dict.get("task", []):
-            if task["name"] in schedules.keys():
+            if task["name"] in schedules:
                 raise Exception(f"'{task['name']}' is duplicated.")
             schedules[task["name"]] = task
         for ms in data_dict.get("milestone", []):
-            if ms["name"] in schedules.keys():
+            if ms["name"] in schedules:
                 raise Exception(f"'{ms['name']}' is duplicated.")
             if "plan" in ms:
                 ms["plan"] = {"start": ms["plan"], "end": ms["plan"]}
             schedules[ms["name"]] = ms
-        dpaths = self._resolve_dependency(project, schedules)
-        ret["dependency_paths"] = dpaths
-
-        for task in data_dict.get("task", []):
-            self._resolve_actual(project, task)
-            t = Task(
-                task["name"],
-                task.get("text", task["name"]),
-                strpdate(task["plan"]["start"]),
-                strpdate(task["plan"]["end"]),
-                self.colors["task"]["plan_fill"],
-                self.colors["task"]["plan_outline"],
-                self.colors["task"]["actual_fill"],
-                self.colors["task"]["actual_outline"],
-                self.colors["task"]["text"],
-                strpdate(task.get("actual", {}).get("start")),
-                strpdate(task.get("actual", {}).get("completed")),
-                task.get("actual", {}).get("progress"),
-                strpdate(task.get("actual", {}).get("end")),
-                task.get("assignee"),
-            )
-            ret["schedules"].append(t)
-
-        for ms in data_dict.get("milestone", []):
-            m = Milestone(
-                ms["name"],
-                ms.get("text", ms["name"]),
-                strpdate(ms["plan"]["start"]),
-                self.colors["milestone"]["plan_fill"],
-                self.colors["milestone"]["plan_outline"],
-                self.colors["milestone"]["actual_fill"],
-                self.colors["milestone"]["actual_outline"],
-                self.colors["milestone"]["text"],
-                strpdate(ms.get("actual", None)),
-            )
-            ret["schedules"].append(m)
 
+        return ret, project, schedules
+
+    def _make_task(self, task):
+        return Task(
+            task["name"],
+            task.get("text", task["name"]),
+            task["plan"]["start"],
+            task["plan"]["end"],
+            self.colors["task"]["plan_fill"],
+            self.colors["task"]["plan_outline"],
+            self.colors["task"]["actual_fill"],
+            self.colors["task"]["actual_outline"],
+            self.colors["task"]["text"],
+            task.get("actual", {}).get("start"),
+            task.get("actual", {}).get("completed"),
+            task.get("actual", {}).get("progress"),
+            task.get("actual", {}).get("end"),
+            task.get("assignee"),
+        )
+
+    def _make_milestone(self, ms):
+        return Milestone(
+            ms["name"],
+            ms.get("text", ms["name"]),
+            ms["plan"]["start"],
+            self.colors["milestone"]["plan_fill"],
+            self.colors["milestone"]["plan_outline"],
+            self.colors["milestone"]["actual_fill"],
+            self.colors["milestone"]["actual_outline"],
+            self.colors["milestone"]["text"],
+            ms.get("actual", None),
+        )
+
+    def _make_groups(self, data_dict, schedules):
+        groups = []
         belongs = set()
         for group in data_dict.get("group", []):
-            ret["groups"].append(Group(group["text"], group["member"]))
+            groups.append(Group(group["text"], group["member"]))
             belongs.update(group["member"])
-        notbelongs_unordered = set([sc.name for sc in ret["schedules"]]) - belongs
+        notbelongs_unordered = set([sc.name for sc in schedules]) - belongs
         notbelongs = []
-        for sc in ret["schedules"]:
+        for sc in schedules:
             if sc.name in notbelongs_unordered:
                 notbelongs.append(sc.name)
-        ret["groups"].insert(0, Group("", notbelongs))
-
-        logger.debug(pformat(ret))
+        groups.insert(0, Group("", notbelongs))
+        return groups
 
-        return ret
-
-    def _resolve_dependency(self, project, schedules):
-        g = Graph()
-        dpaths = []
-        for k, v in schedules.items():
-            g.add_node(k, v)
+    def _build_graph(self, schedules):
+        g = DependencyGraph()
+        for k in schedules.keys():
+            g.add_node(k)
         for k, v in schedules.items():
             plan = v.get("plan")
             if plan is None:
@@ -115,30 +251,69 @@ class Resolver:
                 self._add_dep(g, schedules, k, plan["start"])
             if "end" in plan:
                 self._add_dep(g, schedules, k, plan["end"])
+        return g
 
-        if g.has_cycles():
-            raise Exception("the dependencies are looped!")
+    def _resolve_dependency(self, project, schedules):
+        g = self._build_graph(schedules)
+        dpaths = []
 
-        independents = []
-        for n in g.nodes():
-            if len(g.edges(from_node=n)) == 0 and len(g.edges(to_node=n)) == 0:
-                g.del_node(n)
-                independents.append(n)
+        order = g.topological_order()
+        if self.pool is not None and len(schedules) >= self.pool.threshold:
+            components = g.components()
+            if len(components) > 1 and self.pool.max_workers > 1:
+                resolved = self._resolve_components(project, schedules, order, components)
+                if resolved is not None:
+                    return resolved
 
-        for n in g.nodes():
-            if len(g.edges(from_node=n)) == 0:
-                path = self._search_to_root(g, n, [])
-                for t in reversed(path):
-                    self._resolve_date(project, schedules, t)
-                    dpaths.extend(self._make_dpath(schedules, t))
-        dpaths = list(set(dpaths))
+        for n in order:
+            dpaths.extend(self._resolve_node(project, schedules, n))
 
-        for n in independents:
-            self._resolve_date(project, schedules, n)
+        return dpaths
 
+    def _resolve_node(self, project, schedules, name):
+        self._resolve_date(project, schedules, name)
+        return self._make_dpath(schedules, name)
+
+    def _resolve_components(self, project, schedules, order, components):
+        # Components are packed into a few chunks per worker, largest first,
+        # and each chunk is resolved in the global topological order.
+        positions = {n: i for i, n in enumerate(order)}
+        n_chunks = min(len(components), self.pool.max_workers * 4)
+        chunks = [[] for _ in range(n_chunks)]
+        for component in sorted(components, key=len, reverse=True):
+            min(chunks, key=len).extend(component)
+
+        setup = pickle.dumps((self.business_calendar, self.colors), pickle.HIGHEST_PROTOCOL)
+        project = {"start": project["start"], "end": project["end"]}
+        jobs = []
+        for chunk in chunks:
+            chunk.sort(key=positions.get)
+            plans = {n: schedules[n]["plan"] for n in chunk if schedules[n].get("plan") is not None}
+            jobs.append((plans, chunk))
+        results = self.pool.resolve_chunks(setup, project, jobs)
+        if results is None:
+            return None
+        resolved = {}
+        for result in results:
+            for n, start, end, paths in result:
+                resolved[n] = (start, end, paths)
+
+        # merged in the same order as resolving them in this process
+        dpaths = []
+        for n in order:
+            start, end, paths = resolved[n]
+            plan = schedules[n].get("plan")
+            if plan is not None:
+                for k, v in [("start", start), ("end", end)]:
+                    if k in plan or v is not None:
+                        plan[k] = _date(v)
+            for start_name, start_date, end_date in paths:
+                dpaths.append(DependencyPath(start_name, _date(start_date), n, _date(end_date), self.colors["path"]))
         return dpaths
 
     def _add_dep(self, g, schedules, k, s):
+        if not isinstance(s, str):
+            return
         if not s.endswith("'s start") and not s.endswith("'s end"):
             return
 
@@ -149,34 +324,30 @@ class Resolver:
             if dep != "project":
                 logger.warning(f"warn: '{dep}' does not exist.")
             return
-        g.add_edge(dep, k, 1)
-
-    def _search_to_root(self, g, s, p):
-        p.append(s)
-        for n in g.nodes(to_node=s):
-            self._search_to_root(g, n, p)
-        return p
+        g.add_edge(dep, k)
 
     def _resolve_date(self, project, schedules, name):
-        print(f"resolve date {name}")
+        logger.debug(f"resolve date {name}")
         t = schedules[name]
         plan = t.get("plan")
         if plan is None:
             return
 
         def _date_delta(d, delta):
-            return calc_date_in_business_days(strpdate(d), delta, project["closed_dates"]).strftime("%Y/%m/%d")
+            return self.business_calendar.date_in_business_days(d, delta)
 
         def _(k):
             if plan[k] == "project's start":
                 plan[k] = project["start"]
             if plan[k] == "project's end":
                 plan[k] = project["end"]
+            if not isinstance(plan[k], str):
+                return
             if plan[k].endswith("'s end"):
                 dep = plan[k].replace("'s end", "")
                 plan[k+"_org"] = plan[k]
                 plan[k] = _date_delta(schedules.get(dep, {}).get("plan", {}).get("end"), 2)
-            if plan[k].endswith("'s start"):
+            elif plan[k].endswith("'s start"):
                 dep = plan[k].replace("'s start", "")
                 plan[k+"_org"] = plan[k]
                 plan[k] = _date_delta(schedules.get(dep, {}).get("plan", {}).get("start"), -2)
@@ -186,54 +357,53 @@ class Resolver:
         if "end" in plan:
             _("end")
         if "period" in plan:
-            end_date = calc_date_in_business_days(strpdate(plan["start"]), plan["period"], project["closed_dates"])
-            plan["end"] = end_date.strftime("%Y/%m/%d")
+            plan["end"] = self.business_calendar.date_in_business_days(plan["start"], plan["period"])
 
     def _make_dpath(self, schedules, name):
         t = schedules[name]
         plan = t.get("plan")
         if plan is None:
-            return
+            return []
 
         def _(k):
             if plan[k+"_org"].endswith("'s end"):
                 dep = plan[k+"_org"].replace("'s end", "")
-                dep_end = strpdate(schedules.get(dep, {}).get("plan", {}).get("end"))
-                return DependencyPath(dep, dep_end, name, strpdate(plan[k]), self.colors["path"])
+                dep_end = schedules.get(dep, {}).get("plan", {}).get("end")
+                return DependencyPath(dep, dep_end, name, plan[k], self.colors["path"])
             if plan[k+"_org"].endswith("'s start"):
                 dep = plan[k+"_org"].replace("'s start", "")
-                dep_start = strpdate(schedules.get(dep, {}).get("plan", {}).get("start"))
-                return DependencyPath(dep, dep_start, name, strpdate(plan[k]), self.colors["path"])
+                dep_start = schedules.get(dep, {}).get("plan", {}).get("start")
+                return DependencyPath(dep, dep_start, name, plan[k], self.colors["path"])
 
         paths = []
         if "start_org" in plan:
             paths.append(_("start"))
         if "end_org" in plan:
-            paths.append(_("end"))
+            # a milestone, or a task starting and ending at the same point, refers to it twice
+            path = _("end")
+            if path not in paths:
+                paths.append(path)
         return paths
 
     def _resolve_actual(self, project, task):
-        today = strpdate(project["today"])
+        today = project["today"]
         actual = task.get("actual")
         if actual is None or actual.get("start") is None:
             return
 
         if "period" in actual:
-            end_date = calc_date_in_business_days(strpdate(actual["start"]), actual["period"], project["closed_dates"])
-            actual["end"] = end_date.strftime("%Y/%m/%d")
+            actual["end"] = self.business_calendar.date_in_business_days(actual["start"], actual["period"])
 
         if "progress" in actual:
-            start = strpdate(actual["start"])
+            start = actual["start"]
             progress = actual["progress"]
 
-            dates = set([start + timedelta(i) for i in range((today - start).days)])
-            dates = dates - set(project["closed_dates"])
-            days = math.ceil(len(dates) / progress)
-
-            actual["completed"] = today.strftime("%Y/%m/%d")
+            # the business days from the start until yesterday
+            elapsed = self.business_calendar.business_days(start, today - timedelta(days=1))
+            days = math.ceil(elapsed / progress)
 
-            end_date = calc_date_in_business_days(start, days, project["closed_dates"])
-            actual["end"] = end_date.strftime("%Y/%m/%d")
+            actual["completed"] = today
+            actual["end"] = self.business_calendar.date_in_business_days(start, days)
 
     def _get_colors(self, style):
         colors = {
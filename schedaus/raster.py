@@ -0,0 +1,81 @@
+import io
+import hashlib
+import threading
+from concurrent.futures import TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from schedaus.cache import RenderCache
+from schedaus.pool import ProcessPool
+
+
+class RasterizeError(Exception):
+    pass
+
+
+def svg_to_png(svg_bytes, scale):
+    # imported here so that only the processes rasterizing images load cairo
+    import cairosvg
+
+    byteio = io.BytesIO()
+    cairosvg.svg2png(bytestring=svg_bytes, write_to=byteio, scale=scale)
+    return byteio.getvalue()
+
+
+class Rasterizer:
+    """Rasterize svg into png on a bounded pool of worker processes.
+
+    The png is cached by the hash of the svg and the scale. At most
+    `max_queue` images are rasterized or waiting at once, and a request waits
+    `timeout` seconds at most, so one huge chart cannot hold up the svg
+    requests sharing the worker. An image that timed out is not stopped: it
+    keeps its worker process and its queue slot until it is done. When a
+    worker dies, e.g. killed for its memory, the pool is replaced by a new one
+    on the next image. `max_workers=0` rasterizes in the calling thread.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, timeout=30, cache=None):
+        if cache is None:
+            cache = RenderCache()
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_queue)
+        self.pool = ProcessPool(max_workers)
+
+    def to_png(self, svg_bytes, scale):
+        key = RenderCache.make_key("png", hashlib.sha256(svg_bytes).hexdigest(), scale)
+        png = self.cache.get(key)
+        if png is not None:
+            return png
+
+        if not self.slots.acquire(blocking=False):
+            raise RasterizeError(f"too many images are being rasterized (max: {self.max_queue})")
+
+        if self.max_workers <= 0:
+            try:
+                png = svg_to_png(svg_bytes, scale)
+            finally:
+                self.slots.release()
+        else:
+            try:
+                future = self.pool.submit(svg_to_png, svg_bytes, scale)
+            except Exception:
+                self.slots.release()
+                raise
+            # the slot is held until the image is done, even if the request gave up on it
+            future.add_done_callback(lambda f: self.slots.release())
+            try:
+                png = future.result(timeout=self.timeout)
+            except TimeoutError:
+                # only drops the image if it is still waiting, a running one goes on
+                future.cancel()
+                raise RasterizeError(f"rasterizing took longer than {self.timeout} seconds")
+            except BrokenProcessPool as e:
+                raise RasterizeError(f"a rasterizing process died: {e}")
+
+        self.cache.set(key, png)
+        return png
+
+    def stats(self):
+        return self.cache.stats()
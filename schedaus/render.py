@@ -1,18 +1,69 @@
+import re
+from xml.etree import ElementTree
+from dataclasses import replace
 from datetime import timedelta
 from traceback import format_exc
 
 import svgwrite
+from schedaus import svgtext
 from schedaus.const import C
-from schedaus.model import Task
-from schedaus.utils import get_prefix_space_num, len_multibyte, calc_remain_days_in_month
+from schedaus.model import Task, Group
+from schedaus.utils import get_prefix_space_num, len_multibyte, calc_remain_days_in_month, weekday_to_dates
+
+
+# the characters svgwrite refuses in an id, and "%" so that escaped ids stay unique
+_id_escapes = {ord(c): f"%{ord(c):02X}" for c in "%(), \t\n\r"}
+
+
+def escape_id(name):
+    """Escape a name for an svg id, e.g. "Group 0" into "Group%200"."""
+    return name.translate(_id_escapes)
+
+
+class Layers:
+    """Elements in a bucket per z-order, iterated from the lowest z."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, z, obj):
+        bucket = self.buckets.get(z)
+        if bucket is None:
+            bucket = self.buckets[z] = []
+        bucket.append(obj)
+
+    def __iter__(self):
+        for z in sorted(self.buckets):
+            yield from self.buckets[z]
+
+
+class _XMLElement:
+    """An ElementTree element added to a svgwrite drawing as it is."""
+
+    def __init__(self, xml):
+        self.elementname = xml.tag
+        self.xml = xml
+
+    def get_xml(self):
+        return self.xml
 
 
 class Renderer:
-    def __init__(self, dwg=None):
-        if dwg is None:
+    # the scale of each zoom level of the tiles
+    tile_scales = ["daily", "weekly", "monthly"]
+
+    re_svg_width = re.compile(' width="([0-9.]+)px"')
+    re_svg_height = re.compile(' height="([0-9.]+)px"')
+
+    def __init__(self, dwg=None, backend="svgwrite", calendar_cache=None):
+        if dwg is not None:
+            self.dwg = dwg
+        elif backend == "svgwrite":
             self.dwg = svgwrite.Drawing()
+        elif backend == "text":
+            self.dwg = svgtext.Drawing()
         else:
-            self.dwg = dwg
+            raise Exception(f"unsupported svg backend: {backend}")
 
         # width per day
         self.wpd = C.width_per_day
@@ -25,19 +76,28 @@ class Renderer:
 
         self.scale = "daily"
         self.schedule_offset = self.hpl * 4
+        # the (start, end) dates to draw, None draws the whole project
+        self.window = None
+        # the [top, bottom) pixels of the rows to draw, None draws all the rows
+        self.y_range = None
+        # a CalendarCache to reuse the calendar layers, None draws them every time
+        self.calendar_cache = calendar_cache
 
     def get_svg(self):
         return self.dwg
 
-    def add_error(self):
-        mw = int(self.dwg.attribs["width"][0:-2])
-        mh = int(self.dwg.attribs["height"][0:-2])
-        print(mw, mh)
+    def add_error(self, svg_text):
+        """Append the error text to a rendered svg, and return the new svg text."""
+        head_end = svg_text.index(">") + 1
+        head = svg_text[0:head_end]
+        mw = float(self.re_svg_width.search(head).group(1))
+        mh = float(self.re_svg_height.search(head).group(1))
         text, height = self._generate_error_text(mh)
-        self.dwg.add(text)
-        self.dwg.attribs["height"] = f"{height}px"
+        head = self.re_svg_height.sub(f' height="{height}px"', head, count=1)
         if mw < 640:
-            self.dwg.attribs["width"] = "640px"
+            head = self.re_svg_width.sub(' width="640px"', head, count=1)
+        body = svg_text[head_end:-len("</svg>")]
+        return head + body + text.tostring() + "</svg>"
 
     def draw_error(self):
         text, height = self._generate_error_text()
@@ -69,41 +129,104 @@ class Renderer:
 
         return text, height
 
-    def render(self, data):
+    def render(self, data, window=None, y_range=None):
+        """Render the resolved data.
+
+        `window` is a pair of dates (either can be None) to draw only that
+        range of the project. The rows keep their places, and the schedules
+        and dependency paths out of the window are left out. Likewise the
+        rows out of `y_range`, a [top, bottom) pair of pixels, are left out.
+        """
         schedules_y = {}
-        idx = 0
+        self.y_range = y_range
+
+        if window is not None:
+            data = dict(data, calendar=self._clip_calendar(data["calendar"], window))
+            self.window = (data["calendar"].start, data["calendar"].end)
 
         self.change_scale(data["calendar"].scale)
 
         objs = self.calendar_to_svg(data["calendar"], data)
 
-        def _find(items, name):
-            return [x for x in items if x.name == name][0]
-
-        for group in data["groups"]:
-            if group.text:
-                group_objs = self.group_to_svg(data["calendar"], group)
-                y = self.schedule_offset + self.hpl * (idx * 2)
-                g = self.dwg.g(id=f"group-{group.text}", transform=f"translate(0, {y})")
-                for group_obj in group_objs:
-                    g.add(group_obj)
-                objs.append({"z": 20, "o": g})
-                idx += 1
-            for sc_name in group.member:
-                sc = _find(data["schedules"], sc_name)
-                y = self.schedule_offset + self.hpl * (idx * 2)
-                g = self._render_schedule(sc, y, data)
-                objs.append({"z": 20, "o": g})
-                schedules_y[sc.name] = y
-                idx += 1
+        for y, row in self.layout(data):
+            if not isinstance(row, Group):
+                schedules_y[row.name] = y
+                if not self._schedule_in_window(row):
+                    continue
+            if self._row_in_range(y, y):
+                objs.add(20, self.row_to_svg(data, row, y))
 
         self.register_arrowhead_svg()
         for dpath in data["dependency_paths"]:
+            if not self._in_window(min(dpath.start_date, dpath.end_date), max(dpath.start_date, dpath.end_date)):
+                continue
+            ys = (schedules_y[dpath.start_name], schedules_y[dpath.end_name])
+            if not self._row_in_range(min(ys), max(ys)):
+                continue
             obj = self.dpath_to_svg(data["calendar"], schedules_y, dpath)
-            objs.append({"z": 30, "o": obj})
+            objs.add(30, obj)
+
+        today = self.today_to_svg(data["calendar"])
+        if today is not None:
+            objs.add(99, today)
+
+        for obj in objs:
+            self.dwg.add(obj)
+
+    def render_tile(self, data, z, col, row):
+        """Render a tile of C.tile_width x C.tile_height pixels of the chart.
+
+        The zoom level `z` picks the scale from `tile_scales`, and the tile at
+        (`col`, `row`) is cut out of the chart drawn at that scale: the
+        columns by the dates and the rows by the viewBox.
+        """
+        if not 0 <= z < len(self.tile_scales):
+            raise Exception(f"unsupported zoom level: {z}")
+        calendar = replace(data["calendar"], scale=self.tile_scales[z])
+        data = dict(data, calendar=calendar)
+
+        self.change_scale(calendar.scale)
+        days = C.tile_width // self.wpd
+        start = calendar.start + timedelta(days=days * col)
+        top = C.tile_height * row
+        if col < 0 or row < 0 or start > calendar.end:
+            raise Exception(f"the tile is out of the chart: {z}/{col}/{row}")
+
+        self.render(data, window=(start, start + timedelta(days=days - 1)), y_range=(top, top + C.tile_height))
+        if top >= self.mh:
+            raise Exception(f"the tile is out of the chart: {z}/{col}/{row}")
+        self.dwg.attribs["height"] = f"{C.tile_height}px"
+        self.dwg.attribs["viewBox"] = f"0 {top} {self.mw} {C.tile_height}"
+        return self.dwg
 
-        for obj in sorted(objs, key=lambda x: x["z"]):
-            self.dwg.add(obj["o"])
+    @staticmethod
+    def _clip_calendar(calendar, window):
+        start = calendar.start if window[0] is None else max(window[0], calendar.start)
+        end = calendar.end if window[1] is None else min(window[1], calendar.end)
+        if start > end:
+            raise Exception(f"the window is out of the project: {window[0]} to {window[1]}")
+        closed = [d for d in calendar.closed if start <= d <= end]
+        return replace(calendar, start=start, end=end, closed=closed)
+
+    def _in_window(self, start, end):
+        if self.window is None:
+            return True
+        return start <= self.window[1] and end >= self.window[0]
+
+    def _row_in_range(self, top, bottom):
+        # whether the rows from `top` to `bottom` (both at the row's top) are in y_range
+        if self.y_range is None:
+            return True
+        return top < self.y_range[1] and bottom + self.hpl * 2 > self.y_range[0]
+
+    def _schedule_in_window(self, schedule):
+        if self.window is None:
+            return True
+        if isinstance(schedule, Task):
+            dates = [schedule.plan_start, schedule.plan_end, schedule.actual_start, schedule.actual_end]
+            dates = [d for d in dates if d is not None]
+            return self._in_window(min(dates), max(dates))
+        return self._in_window(schedule.plan_happen, schedule.plan_happen)
 
     def change_scale(self, scale):
         self.scale = scale
@@ -113,32 +236,96 @@ class Renderer:
         elif scale == "weekly":
             self.wpd = 8
             self.schedule_offset = self.hpl * 3
+        elif scale == "monthly":
+            self.wpd = 2
+            self.schedule_offset = self.hpl * 2
 
-    def _render_schedule(self, schedule, y, data):
-        if isinstance(schedule, Task):
-            task = schedule
-            task_objs = self.task_to_svg(data["calendar"], task)
-            g = self.dwg.g(transform=f"translate(0, {y})")
-            for task_obj in sorted(task_objs, key=lambda x: x["z"]):
-                g.add(task_obj["o"])
-        else:
-            ms = schedule
-            ms_objs = self.milestone_to_svg(data["calendar"], ms)
-            g = self.dwg.g(transform=f"translate(0, {y})")
-            for ms_obj in sorted(ms_objs, key=lambda x: x["z"]):
-                g.add(ms_obj["o"])
+    def layout(self, data):
+        """Yield the (y, group or schedule) of each row, from the top.
+
+        The groups without text have no row of their own.
+        """
+        schedules = {sc.name: sc for sc in data["schedules"]}
+        idx = 0
+        for group in data["groups"]:
+            if group.text:
+                yield self.schedule_offset + self.hpl * (idx * 2), group
+                idx += 1
+            for sc_name in group.member:
+                yield self.schedule_offset + self.hpl * (idx * 2), schedules[sc_name]
+                idx += 1
 
+    def row_to_svg(self, data, row, y):
+        if isinstance(row, Group):
+            objs = self.group_to_svg(data["calendar"], row)
+            g = self.dwg.g(id=f"group-{escape_id(row.text)}", transform=f"translate(0, {y})")
+        elif isinstance(row, Task):
+            objs = self.task_to_svg(data["calendar"], row)
+            g = self.dwg.g(id=f"schedule-{escape_id(row.name)}", transform=f"translate(0, {y})")
+        else:
+            objs = self.milestone_to_svg(data["calendar"], row)
+            g = self.dwg.g(id=f"schedule-{escape_id(row.name)}", transform=f"translate(0, {y})")
+        for obj in objs:
+            g.add(obj)
         return g
 
     def calendar_to_svg(self, calendar, data):
-        ph = 1
         self.mw = self.wpd * ((calendar.end - calendar.start).days + 1)
         self.mh = (self.hpl * 3) + (self.hpl * 2 * (len(data["schedules"]) + len(data["groups"])))
         self.dwg.attribs["width"] = f"{self.mw}px"
         self.dwg.attribs["height"] = f"{self.mh}px"
-        self.dwg.add(self.dwg.rect((0, 0), (self.mw, self.mh), fill="#FFFFFF"))
 
-        objs = []
+        if self.calendar_cache is None:
+            self.dwg.add(self.dwg.rect((0, 0), (self.mw, self.mh), fill="#FFFFFF"))
+            objs = self._calendar_layer(calendar)
+        else:
+            # the layer is under everything else, so it is added right away
+            self._add_fragment(self._cached_calendar_layer(calendar))
+            objs = Layers()
+
+        return objs
+
+    def today_to_svg(self, calendar):
+        if not self._in_window(calendar.today, calendar.today):
+            return None
+        x = self.wpd * (calendar.today - calendar.start).days
+        return self.dwg.line((x, 0), (x, self.mh), stroke="#FF0000", stroke_width="3.0")
+
+    def _cached_calendar_layer(self, calendar):
+        # svg text of the background and the calendar layer, from the cache or drawn into it
+        cache = self.calendar_cache
+        # a tile shows what is under the chart, so tiles draw the layer to the chart's height
+        height = self.mh if self.y_range is not None else cache.height_of(self.mh)
+        closed = [d.toordinal() for d in calendar.closed]
+        key = cache.make_key(calendar.start, calendar.end, closed, self.scale, height)
+        fragment = cache.get(key)
+        if fragment is not None:
+            return fragment
+
+        # drawn with the text backend whatever the backend is, as it is kept as text
+        dwg, mh = self.dwg, self.mh
+        self.dwg, self.mh = svgtext.Drawing(), height
+        try:
+            self.dwg.add(self.dwg.rect((0, 0), (self.mw, self.mh), fill="#FFFFFF"))
+            for obj in self._calendar_layer(calendar):
+                self.dwg.add(obj)
+            fragment = self.dwg.body.getvalue()
+        finally:
+            self.dwg, self.mh = dwg, mh
+        cache.set(key, fragment)
+        return fragment
+
+    def _add_fragment(self, fragment):
+        if isinstance(self.dwg, svgtext.Drawing):
+            self.dwg.add(svgtext.Raw(fragment))
+        else:
+            for xml in ElementTree.fromstring(f"<g>{fragment}</g>"):
+                self.dwg.add(_XMLElement(xml))
+
+    def _calendar_layer(self, calendar):
+        # the header, the grid, the closed days and the frame
+        ph = 1
+        objs = Layers()
         prev_month = None
         text_month_opts = {
             "font_size": "13",
@@ -150,79 +337,112 @@ class Renderer:
             "text_anchor": "middle",
         }
         text_day_opts.update(C.text_common_opts)
-        x = 0
-        date = calendar.start
-        while date <= calendar.end:
-            if date.month != prev_month:
+        # the grid lines share a style, so they are drawn as one path
+        grid = []
+        if self.scale == "daily":
+            x = 0
+            date = calendar.start
+            while date <= calendar.end:
+                if date.month != prev_month:
+                    # draw 'YYYY/MM' text
+                    if calc_remain_days_in_month(date) >= 3:
+                        month_text = "{}/{}".format(date.year, date.month)
+                    else:
+                        month_text = "{}".format(date.month)
+                    objs.add(5, self.dwg.text(month_text, (x+1, ph), **text_month_opts))
+                    # draw line per month
+                    grid.append(f"M{x},0V{self.hpl*3}")
+                    # update previous month
+                    prev_month = date.month
+
+                # draw weekday text
+                objs.add(5, self.dwg.text(date.strftime("%a")[0:2], (x+self.wpd/2, self.hpl+ph), **text_day_opts))
+                # draw day text
+                objs.add(5, self.dwg.text(date.day, (x+self.wpd/2, self.hpl*2+ph), **text_day_opts))
+                # draw line per day
+                grid.append(f"M{x},{self.hpl*3}V{self.mh}")
+                x += self.wpd
+                date += timedelta(days=1)
+        else:
+            # weekly and monthly scales step a month or a week at a time
+            for date in self._months(calendar):
+                x = self.wpd * (date - calendar.start).days
                 # draw 'YYYY/MM' text
-                if calc_remain_days_in_month(date) >= 3:
+                if self.scale == "weekly":
+                    long_text = calc_remain_days_in_month(date) >= 3
+                else:
+                    long_text = calc_remain_days_in_month(date) * self.wpd >= 48
+                if long_text:
                     month_text = "{}/{}".format(date.year, date.month)
                 else:
                     month_text = "{}".format(date.month)
-                objs.append({"z": 5, "o": self.dwg.text(month_text, (x+1, ph), **text_month_opts)})
+                objs.add(5, self.dwg.text(month_text, (x+1, ph), **text_month_opts))
                 # draw line per month
-                if self.scale == "daily":
-                    h = self.mh
-                elif self.scale == "weekly":
-                    h = self.hpl
-                objs.append({"z": 10, "o": self.dwg.line((x, 0), (x, h), **C.line_common_opts)})
-                # update previous month
-                prev_month = date.month
-
-            if self.scale == "daily":
-                # draw weekday text
-                objs.append({"z": 5, "o": self.dwg.text(date.strftime("%a")[0:2], (x+self.wpd/2, self.hpl+ph), **text_day_opts)})
-                # draw day text
-                objs.append({"z": 5, "o": self.dwg.text(date.day, (x+self.wpd/2, self.hpl*2+ph), **text_day_opts)})
-                # draw line per day
-                objs.append({"z": 10, "o": self.dwg.line((x, self.hpl*3), (x, self.mh), **C.line_common_opts)})
-            elif self.scale == "weekly":
-                if date.weekday() == 0:
+                h = self.hpl if self.scale == "weekly" else self.mh
+                grid.append(f"M{x},0V{h}")
+
+            if self.scale == "weekly":
+                for date in weekday_to_dates("Monday", calendar.start, calendar.end):
+                    x = self.wpd * (date - calendar.start).days
                     # draw day text
-                    objs.append({"z": 5, "o": self.dwg.text(date.day, (x+self.wpd/2+2, self.hpl+ph), **text_day_opts)})
+                    objs.add(5, self.dwg.text(date.day, (x+self.wpd/2+2, self.hpl+ph), **text_day_opts))
                     # draw line per week
-                    objs.append({"z": 10, "o": self.dwg.line((x, self.hpl), (x, self.mh), **C.line_common_opts)})
-            x += self.wpd
-            date += timedelta(days=1)
-
-        for closed in calendar.closed:
-            offset_days = (closed - calendar.start).days
-            if self.scale == "daily":
-                xy = (self.wpd * offset_days, self.hpl)
-            elif self.scale == "weekly":
-                xy = (self.wpd * offset_days, self.hpl*2)
-            objs.append({"z": 0, "o": self.dwg.rect(xy, (self.wpd, self.mh-self.hpl), fill="#D0D0D0")})
+                    grid.append(f"M{x},{self.hpl}V{self.mh}")
+
+        # a run of closed days is one rect
+        y = self.hpl*2 if self.scale == "weekly" else self.hpl
+        for closed, days in self._closed_runs(calendar.closed):
+            xy = (self.wpd * (closed - calendar.start).days, y)
+            objs.add(0, self.dwg.rect(xy, (self.wpd * days, self.mh-self.hpl), fill="#D0D0D0"))
 
         # Outer frame
-        objs.append({"z": 10, "o": self.dwg.line((self.mw, 0), (self.mw, self.mh), **C.line_common_opts)})
-        objs.append({"z": 10, "o": self.dwg.line((0, self.hpl*0), (self.mw, self.hpl*0), **C.line_common_opts)})
+        grid.append(f"M{self.mw},0V{self.mh}")
+        grid.append(f"M0,{self.hpl*0}H{self.mw}")
         if self.scale == "daily":
-            objs.append({"z": 10, "o": self.dwg.line((0, self.hpl*3), (self.mw, self.hpl*3), **C.line_common_opts)})
+            grid.append(f"M0,{self.hpl*3}H{self.mw}")
         elif self.scale == "weekly":
-            objs.append({"z": 10, "o": self.dwg.line((0, self.hpl*1), (self.mw, self.hpl*1), **C.line_common_opts)})
-            objs.append({"z": 10, "o": self.dwg.line((0, self.hpl*2), (self.mw, self.hpl*2), **C.line_common_opts)})
-
-        # Today's line
-        x = self.wpd * (calendar.today - calendar.start).days
-        objs.append({"z": 99, "o": self.dwg.line((x, 0), (x, self.mh), stroke="#FF0000", stroke_width="3.0")})
+            grid.append(f"M0,{self.hpl*1}H{self.mw}")
+            grid.append(f"M0,{self.hpl*2}H{self.mw}")
+        elif self.scale == "monthly":
+            grid.append(f"M0,{self.hpl*1}H{self.mw}")
+        objs.add(10, self.dwg.path(d=" ".join(grid), fill="none", **C.line_common_opts))
 
         return objs
 
+    @staticmethod
+    def _months(calendar):
+        # the first date of each month in the calendar
+        date = calendar.start
+        while date <= calendar.end:
+            yield date
+            date = (date.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+    @staticmethod
+    def _closed_runs(closed):
+        # (first date, number of days) of each run of consecutive closed dates
+        runs = []
+        for date in closed:
+            if runs and (date - runs[-1][0]).days == runs[-1][1]:
+                runs[-1][1] += 1
+            else:
+                runs.append([date, 1])
+        return runs
+
     def task_to_svg(self, calendar, task):
         delta_to_start = task.plan_start - calendar.start
         delta_to_end = task.plan_end - calendar.start + timedelta(days=1)
 
-        objs = []
+        objs = Layers()
         xy = (self.wpd*delta_to_start.days, 0)
         wh = (self.wpd*(delta_to_end - delta_to_start).days, self.hpl)
         rect = self.dwg.rect(xy, wh, rx=6, ry=6, fill=task.color_plan_fill, stroke=task.color_plan_outline)
-        objs.append({"z": 20, "o": rect})
+        objs.add(20, rect)
         text_task_opts = {"font_size": "13", "color": task.color_text}
         text_task_opts.update(C.text_common_opts)
         text = task.text
         if task.assignee is not None:
             text += f"@{task.assignee}"
-        objs.append({"z": 21, "o": self.dwg.text(text, (xy[0]+2, xy[1]+2), **text_task_opts)})
+        objs.add(21, self.dwg.text(text, (xy[0]+2, xy[1]+2), **text_task_opts))
 
         if task.actual_start is not None and task.actual_end is not None:
             delta_to_start = task.actual_start - calendar.start
@@ -235,7 +455,7 @@ class Renderer:
             else:
                 opt = {"fill": task.color_actual_fill}
             rect = self.dwg.rect(xy, wh, rx=2, ry=2, stroke=task.color_actual_outline, **opt)
-            objs.append({"z": 20, "o": rect})
+            objs.add(20, rect)
 
             if task.actual_progress is not None:
                 xy = (self.wpd*delta_to_end.days+2, self.hpl+5)
@@ -247,14 +467,14 @@ class Renderer:
                     "alignment_baseline": "middle",
                 }
                 text = self.dwg.text(task.actual_progress, xy, **text_opts)
-                objs.append({"z": 20, "o": text})
+                objs.add(20, text)
 
             if task.actual_completed is not None:
                 delta_to_completed = task.actual_completed - calendar.start
                 xy = (self.wpd*delta_to_start.days, self.hpl+2)
                 wh = (self.wpd*(delta_to_completed - delta_to_start).days, 4)
                 rect = self.dwg.rect(xy, wh, rx=2, ry=2, fill=task.color_actual_fill, stroke=task.color_actual_outline)
-                objs.append({"z": 21, "o": rect})
+                objs.add(21, rect)
 
         return objs
 
@@ -269,7 +489,9 @@ class Renderer:
         g = self.dwg.g(transform=f"translate({x}, 0)")
         g.add(m)
         g.add(t)
-        return [{"z": 0, "o": g}]
+        objs = Layers()
+        objs.add(0, g)
+        return objs
 
     def register_arrowhead_svg(self):
         # a rightward arrowhead
@@ -314,8 +536,8 @@ class Renderer:
                 ex = self.wpd * (dpath.end_date - calendar.start).days + self.wpd
             ey = schedules_y[dpath.end_name] + self.hpl / 2
 
-        # adjust for weekly scale
-        if self.scale == "weekly":
+        # adjust for weekly and monthly scales
+        if self.scale in ["weekly", "monthly"]:
             if direction[1] == "right":
                 sx -= self.wpd * 0.5
             if direction[1] == "left":
@@ -335,7 +557,7 @@ class Renderer:
         arrowhead = self.dwg.g(transform=f"translate({ex}, {ey}) rotate({r[direction[1]]})")
         arrowhead.add(self.dwg.use("#arrowhead", fill=dpath.color))
 
-        g = self.dwg.g(id=f"path-{dpath.start_name}-to-{dpath.end_name}")
+        g = self.dwg.g(id=f"path-{escape_id(dpath.start_name)}-to-{escape_id(dpath.end_name)}")
         g.add(l1)
         g.add(l2)
         g.add(arrowhead)
@@ -0,0 +1,206 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from schedaus.model import Group
+from schedaus.proc import Resolver
+from schedaus.render import Renderer, escape_id
+
+
+class Session:
+    """The last chart of a live-editing client, to render the next one incrementally.
+
+    `update()` compares the normalized data with the last one. When only
+    some schedules changed, they and the schedules depending on them are
+    resolved again (see `Resolver.update`), and only their rows and
+    dependency paths are rendered again; the rest of the svg is reused as
+    text. A change of anything else, e.g. the project, the style, the groups
+    or the order of the schedules, renders the whole chart again.
+
+    Each svg has a revision, the hash of its text. A patch is only given to
+    a client sending the revision of the last svg, since a client with
+    requests in flight, or sent to another process, may have another svg.
+    """
+
+    def __init__(self, calendar_cache=None, resolve_pool=None):
+        self.calendar_cache = calendar_cache
+        self.resolve_pool = resolve_pool
+        self.lock = threading.Lock()
+        # the normalized data and the model of the last chart
+        self.data = None
+        self.model = None
+        # the svg text before the rows, and after the dependency paths
+        self.head = None
+        self.tail = None
+        # y -> svg text of the rows, from the top
+        self.rows = None
+        # schedule name -> [(id, svg text)] of the dependency paths to it, in the order of the paths
+        self.paths = None
+        self.schedules_y = None
+        # the width and height attributes of the svg
+        self.size = None
+        self.svg = None
+        self.revision = None
+
+    def update(self, data, revision=None):
+        """Render the normalized data, and return the svg text, the patch to it and its revision.
+
+        The patch is made against the svg of `revision`, the revision the
+        client has. It is None when the whole chart was rendered again, or
+        `revision` is not the one of the last svg. Otherwise it is a dict of
+        the `width` and `height` of the svg, `rows` (id -> svg text of the
+        rows to replace), `remove` (the ids of the dependency paths to remove)
+        and `add` (the svg texts of the dependency paths to append).
+        """
+        with self.lock:
+            base = self.revision
+            changed = self._changed(data)
+            # the resolver modifies the data
+            snapshot = copy.deepcopy(data)
+            if changed is None:
+                self._render_all(data)
+                patch = None
+            else:
+                patch = self._render_changed(data, changed)
+            self.data = snapshot
+            self.revision = hashlib.blake2b(self.svg.encode(), digest_size=16).hexdigest()
+            if revision is None or revision != base:
+                patch = None
+            return self.svg, patch, self.revision
+
+    def _changed(self, data):
+        # the names of the changed schedules, or None if the rows can not be patched
+        if self.data is None:
+            return None
+        for k in ["project", "style", "group"]:
+            if data.get(k) != self.data.get(k):
+                return None
+        changed = set()
+        for kind in ["task", "milestone"]:
+            schedules = data.get(kind, [])
+            previous = self.data.get(kind, [])
+            if [sc["name"] for sc in schedules] != [sc["name"] for sc in previous]:
+                return None
+            changed.update(sc["name"] for sc, prev in zip(schedules, previous) if sc != prev)
+        return changed
+
+    def _renderer(self, model):
+        # the fragments are kept as text, so they are rendered by the text backend
+        renderer = Renderer(backend="text", calendar_cache=self.calendar_cache)
+        renderer.change_scale(model["calendar"].scale)
+        return renderer
+
+    def _render_all(self, data):
+        model = Resolver(self.resolve_pool).resolve(data)
+        r = self._renderer(model)
+        calendar = model["calendar"]
+
+        for obj in r.calendar_to_svg(calendar, model):
+            r.dwg.add(obj)
+        r.register_arrowhead_svg()
+        head = r.dwg.tostring()[0:-len("</svg>")]
+
+        rows = {}
+        schedules_y = {}
+        for y, row in r.layout(model):
+            rows[y] = r.row_to_svg(model, row, y).tostring()
+            if not isinstance(row, Group):
+                schedules_y[row.name] = y
+
+        paths = {}
+        for dpath in model["dependency_paths"]:
+            g = r.dpath_to_svg(calendar, schedules_y, dpath)
+            paths.setdefault(dpath.end_name, []).append((g["id"], g.tostring()))
+
+        today = r.today_to_svg(calendar)
+        tail = "" if today is None else today.tostring()
+
+        self.model = model
+        self.head, self.rows, self.paths, self.tail = head, rows, paths, tail
+        self.schedules_y = schedules_y
+        self.size = (r.dwg.attribs["width"], r.dwg.attribs["height"])
+        self.svg = self._join()
+
+    def _render_changed(self, data, changed):
+        model, dirty = Resolver(self.resolve_pool).update(data, self.model, changed)
+        r = self._renderer(model)
+        calendar = model["calendar"]
+        schedules = {sc.name: sc for sc in model["schedules"]}
+
+        rows = dict(self.rows)
+        patch_rows = {}
+        for name in dirty:
+            y = self.schedules_y[name]
+            text = r.row_to_svg(model, schedules[name], y).tostring()
+            if text != rows[y]:
+                rows[y] = text
+                patch_rows[f"schedule-{escape_id(name)}"] = text
+
+        paths = {}
+        for dpath in model["dependency_paths"]:
+            if dpath.end_name not in dirty:
+                paths[dpath.end_name] = self.paths[dpath.end_name]
+                continue
+            g = r.dpath_to_svg(calendar, self.schedules_y, dpath)
+            paths.setdefault(dpath.end_name, []).append((g["id"], g.tostring()))
+
+        remove = []
+        add = []
+        for name in dirty:
+            previous = self.paths.get(name, [])
+            current = paths.get(name, [])
+            if previous != current:
+                remove.extend(id_ for id_, _ in previous if id_ not in remove)
+                add.extend(text for _, text in current)
+
+        self.model = model
+        self.rows, self.paths = rows, paths
+        self.svg = self._join()
+        return {
+            "width": self.size[0],
+            "height": self.size[1],
+            "rows": patch_rows,
+            "remove": remove,
+            "add": add,
+        }
+
+    def _join(self):
+        paths = "".join(text for texts in self.paths.values() for _, text in texts)
+        return self.head + "".join(self.rows.values()) + paths + self.tail + "</svg>"
+
+
+class SessionStore:
+    """Sessions per client id.
+
+    A session is dropped `expire_min` minutes after its last use, or when
+    there are more than `max_entries` sessions (least recently used first).
+    """
+
+    def __init__(self, max_entries=256, expire_min=5, calendar_cache=None, resolve_pool=None):
+        self.sessions = OrderedDict()
+        self.max_entries = max_entries
+        self.expire_min = expire_min
+        self.calendar_cache = calendar_cache
+        self.resolve_pool = resolve_pool
+        self.lock = threading.Lock()
+
+    def get(self, client_id):
+        now = datetime.now()
+        with self.lock:
+            while self.sessions:
+                key, (_, used) = next(iter(self.sessions.items()))
+                if now - used < timedelta(minutes=self.expire_min):
+                    break
+                del self.sessions[key]
+
+            entry = self.sessions.pop(client_id, None)
+            session = Session(self.calendar_cache, self.resolve_pool) if entry is None else entry[0]
+            self.sessions[client_id] = (session, now)
+            while len(self.sessions) > self.max_entries:
+                self.sessions.popitem(last=False)
+            return session
+
+    def stats(self):
+        return {"entries": len(self.sessions)}
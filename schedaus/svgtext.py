@@ -0,0 +1,157 @@
+"""A drop-in for the part of svgwrite that Renderer uses, writing svg text directly.
+
+Elements are not validated, and an element is serialized into the drawing's
+buffer as soon as it is added to the drawing. The output is the same text as
+svgwrite's `tostring()`: attributes sorted by name, empty and None attributes
+dropped, and the same escaping as ElementTree.
+"""
+import io
+
+
+def _escape_text(s):
+    if "&" in s:
+        s = s.replace("&", "&amp;")
+    if "<" in s:
+        s = s.replace("<", "&lt;")
+    if ">" in s:
+        s = s.replace(">", "&gt;")
+    return s
+
+
+def _escape_attrib(s):
+    s = _escape_text(s)
+    if '"' in s:
+        s = s.replace('"', "&quot;")
+    if "\r" in s:
+        s = s.replace("\r", "&#13;")
+    if "\n" in s:
+        s = s.replace("\n", "&#10;")
+    if "\t" in s:
+        s = s.replace("\t", "&#09;")
+    return s
+
+
+def _attribs(extra):
+    return {k.rstrip("_").replace("_", "-"): v for k, v in extra.items()}
+
+
+class Element:
+    __slots__ = ("elementname", "attribs", "elements", "text")
+
+    def __init__(self, elementname, attribs, text=None):
+        self.elementname = elementname
+        self.attribs = attribs
+        self.elements = []
+        self.text = text
+
+    def __getitem__(self, key):
+        return self.attribs[key]
+
+    def __setitem__(self, key, value):
+        self.attribs[key] = value
+
+    def add(self, element):
+        self.elements.append(element)
+        return element
+
+    def write(self, out):
+        out.write("<")
+        out.write(self.elementname)
+        for k, v in sorted(self.attribs.items()):
+            if v is None:
+                continue
+            v = str(v)
+            if v:
+                out.write(f' {k}="{_escape_attrib(v)}"')
+        text = "" if self.text is None else str(self.text)
+        if not text and not self.elements:
+            out.write(" />")
+            return
+        out.write(">")
+        out.write(_escape_text(text))
+        for element in self.elements:
+            element.write(out)
+        out.write(f"</{self.elementname}>")
+
+    def tostring(self):
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
+
+
+class Raw:
+    """Svg text written as it is, e.g. a fragment serialized before."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def write(self, out):
+        out.write(self.text)
+
+    def tostring(self):
+        return self.text
+
+
+class Drawing:
+    def __init__(self, size=("100%", "100%")):
+        self.attribs = {"width": size[0], "height": size[1]}
+        self.defs = Element("defs", {})
+        self.body = io.StringIO()
+
+    def add(self, element):
+        element.write(self.body)
+        return element
+
+    def tostring(self):
+        attribs = dict(self.attribs)
+        attribs["xmlns"] = "http://www.w3.org/2000/svg"
+        attribs["xmlns:xlink"] = "http://www.w3.org/1999/xlink"
+        attribs["xmlns:ev"] = "http://www.w3.org/2001/xml-events"
+        attribs["baseProfile"] = "full"
+        attribs["version"] = "1.1"
+        head = Element("svg", attribs).tostring()
+        return head[0:-len(" />")] + ">" + self.defs.tostring() + self.body.getvalue() + "</svg>"
+
+    def g(self, **extra):
+        return Element("g", _attribs(extra))
+
+    def rect(self, insert, size, **extra):
+        attribs = _attribs(extra)
+        attribs["x"], attribs["y"] = insert
+        attribs["width"], attribs["height"] = size
+        return Element("rect", attribs)
+
+    def line(self, start, end, **extra):
+        attribs = _attribs(extra)
+        attribs["x1"], attribs["y1"] = start
+        attribs["x2"], attribs["y2"] = end
+        return Element("line", attribs)
+
+    def path(self, d=None, **extra):
+        attribs = _attribs(extra)
+        attribs["d"] = d
+        return Element("path", attribs)
+
+    def polyline(self, points, **extra):
+        attribs = _attribs(extra)
+        attribs["points"] = " ".join(f"{x},{y}" for x, y in points)
+        return Element("polyline", attribs)
+
+    def text(self, text, insert, **extra):
+        attribs = _attribs(extra)
+        attribs["x"], attribs["y"] = insert
+        return Element("text", attribs, text)
+
+    def tspan(self, text, insert, dy=None, **extra):
+        attribs = _attribs(extra)
+        attribs["x"], attribs["y"] = insert
+        if dy is not None:
+            attribs["dy"] = " ".join(str(v) for v in dy)
+        return Element("tspan", attribs, text)
+
+    def use(self, href, **extra):
+        attribs = _attribs(extra)
+        attribs["xlink:href"] = href
+        return Element("use", attribs)
@@ -1,6 +1,7 @@
 import re
 import math
 import base64
+from bisect import bisect_left, bisect_right
 from string import hexdigits
 from datetime import datetime, date, timedelta
 
@@ -24,15 +25,83 @@ def strpdate(s, fmt="%Y/%m/%d"):
     return date(dt.year, dt.month, dt.day)
 
 
+# weekday name -> date.weekday(); 1970/1/5 is a Monday
+weekday_numbers = {date(1970, 1, 5 + i).strftime("%A"): i for i in range(7)}
+
+
+def _weekday_ordinals(weekday, start, end):
+    # date.fromordinal(1) is a Monday, so the weekday of an ordinal o is (o + 6) % 7
+    s = start.toordinal()
+    first = s + (weekday - (s + 6) % 7) % 7
+    return range(first, end.toordinal() + 1, 7)
+
+
 def weekday_to_dates(weekday, start, end):
-    dates = []
-    d = date(start.year, start.month, start.day)
-    while d != (end + timedelta(days=1)):
-        if d.strftime("%A") == weekday:
-            dates.append(d)
-        d = date(d.year, d.month, d.day)
-        d += timedelta(days=1)
-    return dates
+    if weekday not in weekday_numbers:
+        return []
+    return [date.fromordinal(o) for o in _weekday_ordinals(weekday_numbers[weekday], start, end)]
+
+
+class ClosedDays:
+    """Closed days as a bitmask of weekdays plus explicitly closed dates and ranges.
+
+    A weekday rule costs one bit and a range two ordinals however long they
+    are. Membership is checked against the bitmask, a set of the ordinals of
+    the dates, and a bisect of the ranges.
+    """
+
+    def __init__(self):
+        # bit i is set when the days with date.weekday() == i are closed
+        self.weekdays = 0
+        self.ordinals = set()
+        # the first and last ordinals of the closed ranges, sorted and merged
+        # so that the ranges neither overlap nor touch each other
+        self.range_starts = []
+        self.range_ends = []
+
+    def add_weekday(self, weekday):
+        """Close a weekday by its name ("Saturday"). Unknown names are ignored."""
+        if weekday in weekday_numbers:
+            self.weekdays |= 1 << weekday_numbers[weekday]
+
+    def add_date(self, d):
+        self.ordinals.add(d.toordinal())
+
+    def add_range(self, start, end):
+        """Close the days from `start` to `end`, both inclusive."""
+        s = start.toordinal()
+        e = end.toordinal()
+        if e < s:
+            return
+        # the ranges from i to j - 1 overlap or touch the new one
+        i = bisect_left(self.range_ends, s - 1)
+        j = bisect_right(self.range_starts, e + 1)
+        if i < j:
+            s = min(s, self.range_starts[i])
+            e = max(e, self.range_ends[j - 1])
+        self.range_starts[i:j] = [s]
+        self.range_ends[i:j] = [e]
+
+    def is_closed_ordinal(self, o):
+        if self.weekdays >> ((o + 6) % 7) & 1 or o in self.ordinals:
+            return True
+        i = bisect_right(self.range_starts, o) - 1
+        return i >= 0 and o <= self.range_ends[i]
+
+    def __contains__(self, d):
+        return self.is_closed_ordinal(d.toordinal())
+
+    def dates(self, start, end):
+        """Return the closed dates from `start` to `end` in order."""
+        s = start.toordinal()
+        e = end.toordinal()
+        ordinals = {o for o in self.ordinals if s <= o <= e}
+        for i in range(bisect_left(self.range_ends, s), bisect_right(self.range_starts, e)):
+            ordinals.update(range(max(self.range_starts[i], s), min(self.range_ends[i], e) + 1))
+        for i in range(7):
+            if self.weekdays >> i & 1:
+                ordinals.update(_weekday_ordinals(i, start, end))
+        return [date.fromordinal(o) for o in sorted(ordinals)]
 
 
 def calc_date_in_business_days(start, days, holidays):
@@ -65,6 +134,77 @@ def calc_business_days(start, end, holidays):
     return days
 
 
+class BusinessCalendar:
+    """Business day arithmetic over the range from `start` to `end`.
+
+    The number of open days is indexed once as a prefix sum, so that adding or
+    counting business days inside the range is a bisect instead of a walk.
+    Dates out of the range fall back to `calc_date_in_business_days` and
+    `calc_business_days`. `closed` is a `ClosedDays` or an iterable of dates.
+    """
+
+    def __init__(self, start, end, closed):
+        if not isinstance(closed, ClosedDays):
+            dates = closed
+            closed = ClosedDays()
+            for d in dates:
+                closed.add_date(d)
+        self.start = start
+        self.end = end
+        self.closed = closed
+
+        # opens[i] is the number of open days in [start, start + i)
+        is_closed = closed.is_closed_ordinal
+        self.opens = [0]
+        n = 0
+        for o in range(start.toordinal(), end.toordinal() + 1):
+            if not is_closed(o):
+                n += 1
+            self.opens.append(n)
+
+    def _index(self, d):
+        i = (d - self.start).days
+        if 0 <= i < len(self.opens) - 1:
+            return i
+        return None
+
+    def is_open(self, d):
+        return d not in self.closed
+
+    def date_in_business_days(self, start, days):
+        """Same as `calc_date_in_business_days` with this calendar's closed days."""
+        days = int(math.copysign(math.ceil(math.fabs(days)), days))
+
+        if days == 0 or days == 1 or days == -1:
+            return date(start.year, start.month, start.day)
+
+        i = self._index(start)
+        if i is not None:
+            if days > 0:
+                j = bisect_left(self.opens, self.opens[i] + days)
+                if j < len(self.opens):
+                    return self.start + timedelta(days=j - 1)
+            else:
+                target = self.opens[i + 1] + days
+                if target >= 0:
+                    j = bisect_right(self.opens, target) - 1
+                    return self.start + timedelta(days=j)
+
+        return calc_date_in_business_days(start, days, self.closed)
+
+    def business_days(self, start, end):
+        """Same as `calc_business_days` with this calendar's closed days."""
+        if end < start:
+            return 0
+
+        i = self._index(start)
+        j = self._index(end)
+        if i is not None and j is not None:
+            return self.opens[j + 1] - self.opens[i]
+
+        return calc_business_days(start, end, self.closed)
+
+
 def calc_remain_days_in_month(start):
     n = 0
     d = date(start.year, start.month, start.day)
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 
 setup(
     name="schedaus",
-    version="1.0",
+    version="1.1",
     description="Text based gantt chart renderer",
     author="rsp9u",
     packages=find_packages(),
@@ -11,7 +11,6 @@ setup(
         "PyYAML",
         "flask",
         "svgwrite",
-        "graph-theory",
         "cairosvg",
     ],
 )
@@ -0,0 +1,67 @@
+import unittest
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+from schedaus.const import C
+from schedaus.model import Task
+
+
+@dataclass
+class DataclassTask:
+    # Task as it was before the slotted models
+    name: str
+    text: str
+    plan_start: date
+    plan_end: date
+    color_plan_fill: str
+    color_plan_outline: str
+    color_actual_fill: str
+    color_actual_outline: str
+    color_text: str
+    actual_start: Optional[date] = None
+    actual_completed: Optional[date] = None
+    actual_progress: Optional[str] = None
+    actual_end: Optional[date] = None
+    assignee: Optional[str] = None
+
+
+class BenchModel(unittest.TestCase):
+    def _measure(self, cls, n):
+        colors = dict(C.default_colors)
+        start = date(2020, 4, 1)
+
+        tracemalloc.start()
+        tasks = []
+        for i in range(n):
+            # the resolver makes new dates per task and the parser new strings,
+            # the texts and the assignees are repeated, and the colors are shared
+            tasks.append(cls(
+                f"task{i}",
+                f"Task {i % 100}",
+                start + timedelta(days=i % 300),
+                start + timedelta(days=i % 300 + 5),
+                colors["plan_fill"],
+                colors["plan_outline"],
+                colors["actual_fill"],
+                colors["actual_outline"],
+                colors["text"],
+                start + timedelta(days=i % 300),
+                None,
+                0.5,
+                start + timedelta(days=i % 300 + 10),
+                f"member{i % 20}",
+            ))
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size, tasks
+
+    def test_bench_memory(self):
+        for n in [10000, 50000]:
+            old, old_tasks = self._measure(DataclassTask, n)
+            new, new_tasks = self._measure(Task, n)
+            print(f"{n:5d} tasks: dataclass {old / 1024 / 1024:6.1f} MiB, slotted {new / 1024 / 1024:6.1f} MiB"
+                  f" ({old / n:.0f} -> {new / n:.0f} bytes/task)")
+            self.assertEqual(new_tasks[-1].plan_end, old_tasks[-1].plan_end)
+            self.assertLess(new, old * 0.7)
@@ -0,0 +1,45 @@
+import unittest
+import timeit
+
+from schedaus.parse import Parser, IncrementalParser
+from tests.data import make_sch
+from tests.test_parse import LinearParser
+
+
+class BenchParse(unittest.TestCase):
+    def test_bench_dispatch(self):
+        lines = make_sch(10000).splitlines()
+
+        def _match(parser):
+            match = parser.match
+            for line in lines:
+                match(line)
+
+        linear = min(timeit.repeat(lambda: _match(LinearParser()), number=1, repeat=3))
+        table = min(timeit.repeat(lambda: _match(Parser()), number=1, repeat=3))
+        print(f"dispatch {len(lines)} lines: linear {linear*1000:.1f} ms, table {table*1000:.1f} ms")
+        self.assertLess(table, linear)
+
+    def test_bench_parse(self):
+        per_task = []
+        for n in [2500, 5000, 10000]:
+            source = make_sch(n)
+            sec = min(timeit.repeat(lambda: Parser().parse(source), number=1, repeat=3))
+            per_task.append(sec / n)
+            print(f"parse {n:5d} tasks ({len(source.splitlines())} lines): {sec*1000:8.1f} ms")
+
+        # linear scaling: the cost per task stays roughly constant
+        self.assertLess(per_task[-1], per_task[0] * 3)
+
+    def test_bench_incremental(self):
+        source = make_sch(10000)
+        ip = IncrementalParser(source)
+        i = len(source.splitlines()) // 2
+        while not ip.lines[i].startswith("  @"):
+            i += 1
+
+        full = min(timeit.repeat(lambda: Parser().parse(source), number=1, repeat=3))
+        update = min(timeit.repeat(lambda: ip.update(i, i + 1, ["  @bob"]), number=1, repeat=3))
+        output = min(timeit.repeat(ip.get_output, number=1, repeat=3))
+        print(f"full parse {full*1000:.1f} ms, update {update*1000:.1f} ms, get_output {output*1000:.1f} ms")
+        self.assertLess(update, full / 10)
@@ -0,0 +1,150 @@
+import os
+import math
+import pickle
+import tempfile
+import unittest
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+
+from schedaus.cache import DiskModelCache
+from schedaus.model import dump_model
+from schedaus.normalize import Normalizer
+from schedaus.proc import Resolver, ResolvePool
+from schedaus.utils import ClosedDays, BusinessCalendar
+from tests.data import make_lattice, make_projects
+
+
+class BenchProc(unittest.TestCase):
+    def test_bench_lattice(self):
+        width = 50
+        per_node = []
+        for depth in [25, 50, 100]:
+            def _resolve():
+                d = make_lattice(width, depth)
+                Normalizer().normalize(d)
+                Resolver().resolve(d)
+
+            n = width * depth
+            sec = min(timeit.repeat(_resolve, number=1, repeat=3))
+            per_node.append(sec / n)
+            print(f"lattice {n:5d} nodes: {sec*1000:8.1f} ms ({sec/n*1e6:.1f} us/node)")
+
+        # linear scaling: the cost per node stays roughly constant
+        self.assertLess(per_node[-1], per_node[0] * 3)
+
+    def test_bench_closed_days(self):
+        start = date(2020, 1, 1)
+        end = date(2029, 12, 31)
+
+        def _strftime():
+            # the day-by-day expansion weekday_to_dates used to do
+            dates = []
+            for weekday in ["Saturday", "Sunday"]:
+                d = start
+                while d <= end:
+                    if d.strftime("%A") == weekday:
+                        dates.append(d)
+                    d += timedelta(days=1)
+            return dates
+
+        def _closed_days():
+            closed = ClosedDays()
+            closed.add_weekday("Saturday")
+            closed.add_weekday("Sunday")
+            return closed.dates(start, end)
+
+        self.assertEqual(sorted(_strftime()), _closed_days())
+        old = min(timeit.repeat(_strftime, number=1, repeat=3))
+        new = min(timeit.repeat(_closed_days, number=1, repeat=3))
+        print(f"closed days over 10 years: strftime {old*1000:.1f} ms, ClosedDays {new*1000:.1f} ms")
+        self.assertLess(new, old)
+
+    def test_bench_components(self):
+        pool = ResolvePool(0, max_workers=4)
+        results = {}
+        models = {}
+        try:
+            for name, resolver in [("serial", Resolver()), ("parallel", Resolver(pool))]:
+                def _resolve():
+                    d = make_projects(40, 25, 20)
+                    Normalizer().normalize(d)
+                    start = timeit.default_timer()
+                    models[name] = resolver.resolve(d)
+                    return timeit.default_timer() - start
+                # the first chart starts the pool
+                _resolve()
+                results[name] = min(_resolve() for _ in range(3))
+                print(f"{name} 40 components of 500 nodes: {results[name]*1000:8.1f} ms")
+        finally:
+            pool.shutdown()
+        self.assertEqual(models["parallel"], models["serial"])
+        if (os.cpu_count() or 1) < 4:
+            self.skipTest("the speedup needs as many cores as workers")
+        self.assertLess(results["parallel"], results["serial"])
+
+    def test_bench_progress(self):
+        # 3,000 tasks with progress, running for up to 2 years
+        start = date(2020, 1, 1)
+        today = date(2022, 1, 1)
+        closed = ClosedDays()
+        closed.add_weekday("Saturday")
+        closed.add_weekday("Sunday")
+        resolver = Resolver()
+        resolver.business_calendar = BusinessCalendar(start, date(2024, 12, 31), closed)
+        closed_dates = closed.dates(start, date(2024, 12, 31))
+
+        def _tasks():
+            return [{"actual": {"start": start + timedelta(days=i % 700), "progress": 0.5}} for i in range(3000)]
+
+        def _sets(tasks):
+            # the sets of elapsed days and closed days per task it used to build
+            for task in tasks:
+                actual = task["actual"]
+                dates = set([actual["start"] + timedelta(i) for i in range((today - actual["start"]).days)])
+                dates = dates - set(closed_dates)
+                days = math.ceil(len(dates) / actual["progress"])
+                actual["end"] = resolver.business_calendar.date_in_business_days(actual["start"], days)
+
+        def _counter(tasks):
+            for task in tasks:
+                resolver._resolve_actual({"today": today}, task)
+
+        results = {}
+        for name, f in [("sets", _sets), ("counter", _counter)]:
+            tasks = _tasks()
+            sec = min(timeit.repeat(lambda: f(tasks), number=1, repeat=3))
+            fresh = _tasks()
+            tracemalloc.start()
+            f(fresh)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = (sec, peak, [t["actual"]["end"] for t in tasks])
+            print(f"progress of 3000 tasks with {name:7s}: {sec*1000:8.1f} ms, peak {peak / 1024:8.1f} KiB")
+
+        self.assertEqual(results["counter"][2], results["sets"][2])
+        self.assertLess(results["counter"][0], results["sets"][0])
+        self.assertLess(results["counter"][1], results["sets"][1])
+
+    def test_bench_model_disk_cache(self):
+        # resolving 3,000 tasks, against reading them resolved by another worker
+        def _resolve():
+            d = make_lattice(10, 300)
+            Normalizer().normalize(d)
+            return Resolver().resolve(d)
+
+        model = _resolve()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            DiskModelCache(tmpdir).set("lattice", model)
+
+            def _load():
+                return DiskModelCache(tmpdir).get("lattice")
+
+            self.assertEqual(_load(), model)
+            resolve = min(timeit.repeat(_resolve, number=1, repeat=3))
+            load = min(timeit.repeat(_load, number=1, repeat=3))
+
+        size = len(dump_model(model))
+        print(f"3000 tasks: resolve {resolve*1000:.1f} ms, from the disk cache {load*1000:.1f} ms")
+        print(f"3000 tasks: {size} bytes on disk, {len(pickle.dumps(model))} bytes pickled")
+        self.assertLess(load, resolve)
@@ -0,0 +1,124 @@
+import copy
+import unittest
+import timeit
+
+from schedaus.normalize import Normalizer
+from schedaus.proc import Resolver
+from schedaus.render import Renderer
+from schedaus.cache import CalendarCache
+from schedaus.session import Session
+from tests.data import make_lattice, make_schedules
+
+
+class BenchRender(unittest.TestCase):
+    def test_bench_backends(self):
+        # about 2 years in daily scale
+        d = make_lattice(10, 50)
+        Normalizer().normalize(d)
+        data = Resolver().resolve(d)
+
+        results = {}
+        for backend in ["svgwrite", "text"]:
+            def _render():
+                renderer = Renderer(backend=backend)
+                renderer.render(data)
+                return renderer.get_svg().tostring()
+
+            sec = min(timeit.repeat(_render, number=1, repeat=3))
+            results[backend] = sec
+            print(f"{backend:8s} {len(data['schedules'])} schedules: {sec*1000:8.1f} ms")
+
+        print(f"text backend is {results['svgwrite'] / results['text']:.1f}x faster")
+        self.assertLess(results["text"], results["svgwrite"])
+
+    def test_bench_schedules(self):
+        per_schedule = []
+        for n in [1000, 5000, 20000]:
+            d = make_schedules(n)
+            Normalizer().normalize(d)
+            data = Resolver().resolve(d)
+
+            def _render():
+                renderer = Renderer(backend="text")
+                renderer.render(data)
+
+            sec = min(timeit.repeat(_render, number=1, repeat=3))
+            per_schedule.append(sec / n)
+            print(f"render {n:5d} schedules: {sec*1000:8.1f} ms ({sec/n*1e6:.1f} us/schedule)")
+
+        # linear scaling: the cost per schedule stays roughly constant
+        self.assertLess(per_schedule[-1], per_schedule[0] * 3)
+
+    def test_bench_scales(self):
+        # 5 years of a few schedules, so the calendar dominates
+        d = make_schedules(20)
+        d["project"]["end"] = "2025/3/31"
+        Normalizer().normalize(d)
+        data = Resolver().resolve(d)
+
+        results = {}
+        for scale in ["daily", "weekly", "monthly"]:
+            data["calendar"].scale = scale
+
+            def _render():
+                renderer = Renderer(backend="text")
+                renderer.render(data)
+                return renderer.get_svg().tostring()
+
+            sec = min(timeit.repeat(_render, number=1, repeat=3))
+            svg = _render()
+            results[scale] = sec
+            print(f"{scale:8s} 5 years: {sec*1000:8.1f} ms, {len(svg)} bytes, {svg.count('<')} elements")
+
+        self.assertLess(results["weekly"], results["daily"])
+        self.assertLess(results["monthly"], results["weekly"])
+
+    def test_bench_calendar_cache(self):
+        # 5 years of a few schedules, so the calendar dominates
+        d = make_schedules(20)
+        d["project"]["end"] = "2025/3/31"
+        Normalizer().normalize(d)
+        data = Resolver().resolve(d)
+        cache = CalendarCache()
+
+        results = {}
+        for name, calendar_cache in [("uncached", None), ("cached", cache)]:
+            def _render():
+                renderer = Renderer(backend="text", calendar_cache=calendar_cache)
+                renderer.render(data)
+                return renderer.get_svg().tostring()
+
+            sec = min(timeit.repeat(_render, number=1, repeat=5))
+            results[name] = sec
+            print(f"{name:8s} 5 years: {sec*1000:8.1f} ms")
+
+        print(f"the cached calendar is {results['uncached'] / results['cached']:.1f}x faster")
+        self.assertLess(results["cached"], results["uncached"])
+
+    def test_bench_session(self):
+        # 3,000 tasks, and an edit of a task in the last layers of the lattice
+        d = make_lattice(10, 300)
+        Normalizer().normalize(d)
+        edited = copy.deepcopy(d)
+        edited["task"][2950]["plan"] = {"start": "n294_0's end", "period": 3.0}
+
+        def _full():
+            renderer = Renderer(backend="text")
+            renderer.render(Resolver().resolve(copy.deepcopy(edited)))
+            return renderer.get_svg().tostring()
+
+        session = Session()
+        session.update(copy.deepcopy(d))
+        sources = [d, edited]
+
+        def _incremental():
+            # an edit and its undo by turns
+            sources.reverse()
+            return session.update(copy.deepcopy(sources[0]))[0]
+
+        full = min(timeit.repeat(_full, number=1, repeat=3))
+        incremental = min(timeit.repeat(_incremental, number=1, repeat=4))
+        print(f"full        3000 tasks: {full*1000:8.1f} ms")
+        print(f"incremental 3000 tasks: {incremental*1000:8.1f} ms ({full / incremental:.1f}x faster)")
+        self.assertEqual(session.update(copy.deepcopy(edited))[0], _full())
+        self.assertLess(incremental, full)
@@ -66,3 +66,87 @@ group:
   - text: Task
     member: [TK1, TK2]
 """
+
+
+def make_lattice(width, depth, prefix="n"):
+    """A diamond lattice: each task depends on two tasks of the previous layer."""
+    tasks = []
+    for i in range(depth):
+        for j in range(width):
+            if i == 0:
+                plan = {"start": "2020/4/1", "period": 2.0}
+            else:
+                plan = {
+                    "start": f"{prefix}{i-1}_{j}'s end",
+                    "end": f"{prefix}{i-1}_{(j+1) % width}'s end",
+                }
+            tasks.append({"name": f"{prefix}{i}_{j}", "plan": plan})
+
+    return {
+        "project": {
+            "start": "2020/4/1",
+            "end": "2021/12/31",
+            "closed": ["Saturday", "Sunday"],
+            "today": "2020/4/20",
+        },
+        "task": tasks,
+    }
+
+
+def make_projects(n_projects, width, depth):
+    """Unconnected lattices, like a program made of independent sub-projects."""
+    data = make_lattice(width, depth, prefix="p0_n")
+    for k in range(1, n_projects):
+        data["task"].extend(make_lattice(width, depth, prefix=f"p{k}_n")["task"])
+    return data
+
+
+def make_schedules(n, group_size=100):
+    """Independent tasks and milestones in groups of `group_size`."""
+    tasks = []
+    milestones = []
+    groups = []
+    for i in range(n):
+        name = f"sc{i}"
+        if i % 10 == 9:
+            milestones.append({"name": name, "plan": f"2020/4/{i % 28 + 1}"})
+        else:
+            tasks.append({"name": name, "plan": {"start": f"2020/4/{i % 28 + 1}", "period": 3.0}})
+        if i % group_size == 0:
+            groups.append({"text": f"group{i // group_size}", "member": []})
+        groups[-1]["member"].append(name)
+
+    return {
+        "project": {
+            "start": "2020/4/1",
+            "end": "2020/5/31",
+            "closed": ["Saturday", "Sunday"],
+            "today": "2020/4/20",
+        },
+        "task": tasks,
+        "milestone": milestones,
+        "group": groups,
+    }
+
+
+def make_sch(n_tasks):
+    """A .sch source of `n_tasks` tasks, about 5 lines per task."""
+    lines = [
+        "project lasts 2020/4/1 to 2021/3/31",
+        "saturday are closed",
+        "sunday are closed",
+        "today is 2020/4/20",
+        "",
+    ]
+    for i in range(n_tasks):
+        if i % 100 == 0:
+            lines.append(f"-- Group {i // 100} --")
+        lines.append(f"task{i}: \"Task {i}\"")
+        if i % 100 == 0:
+            lines.append("  >> 2020/4/1")
+        else:
+            lines.append(f"  >> task{i-1}'s end")
+        lines.append("  >= 2 days")
+        lines.append("  @alice")
+        lines.append("")
+    return "\n".join(lines)
@@ -3,6 +3,7 @@ import yaml
 import cProfile
 import pstats
 
+from schedaus.normalize import Normalizer
 from schedaus.proc import Resolver
 from tests.data import example_yaml
 
@@ -10,6 +11,7 @@ from tests.data import example_yaml
 class ProfileProc(unittest.TestCase):
     def test_profile(self):
         d = yaml.safe_load(example_yaml)
+        Normalizer().normalize(d)
         pr = cProfile.Profile()
         pr.enable()
         Resolver().resolve(d)
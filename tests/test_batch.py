@@ -0,0 +1,107 @@
+import os
+import base64
+import unittest
+from unittest.mock import patch
+
+from schedaus import pipeline
+from schedaus.batch import BatchRenderer, BatchError
+from schedaus.cache import RenderCache
+from schedaus.raster import Rasterizer
+
+
+def _die(*args):
+    # the worker is killed, e.g. for its memory
+    os._exit(1)
+
+
+class TestBatchRenderer(unittest.TestCase):
+    def setUp(self):
+        with open("example/example.sch") as f:
+            self.sch = f.read()
+        self.patcher = patch("schedaus.raster.svg_to_png", lambda svg_bytes, scale: b"png" + svg_bytes[:4])
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def make_renderer(self, max_workers=0):
+        return BatchRenderer(RenderCache(), Rasterizer(max_workers=0), max_workers=max_workers, max_items=10)
+
+    def test_render(self):
+        items = [
+            {"format": "svg", "source_type": "sch", "source": self.sch},
+            {"format": "png", "source_type": "sch", "source": self.sch},
+            {"format": "svg", "source_type": "sch", "source": "project lasts x"},
+            {"format": "svg", "source_type": "sch", "source": self.sch},
+        ]
+        calls = []
+
+        def _render_svg(source, source_type, backend="svgwrite"):
+            calls.append(source)
+            return pipeline.render(source, source_type, backend).get_svg().tostring().encode()
+
+        br = self.make_renderer()
+        with patch("schedaus.pipeline.render_svg", _render_svg):
+            results = br.render(items, 1.8)
+
+        expected = pipeline.render_svg(self.sch, "sch").decode()
+        self.assertEqual(results[0]["format"], "svg")
+        self.assertEqual(results[0]["data"], expected)
+        self.assertEqual(results[0]["etag"], RenderCache.make_etag("sch", self.sch, "svg"))
+        self.assertEqual(results[1]["format"], "png")
+        self.assertEqual(base64.b64decode(results[1]["data"]), b"png<svg")
+        self.assertEqual(results[1]["etag"], RenderCache.make_etag("sch", self.sch, "png", 1.8))
+        self.assertIn("error", results[2])
+        self.assertEqual(results[3], results[0])
+        # every source is rendered once
+        self.assertEqual(calls, [self.sch, "project lasts x"])
+
+        # rendered images are cached
+        with patch("schedaus.pipeline.render_svg", _render_svg):
+            self.assertEqual(br.render(items[0:2], 1.8), results[0:2])
+        self.assertEqual(len(calls), 2)
+
+    def test_render_on_pool(self):
+        items = [
+            {"format": "svg", "source_type": "sch", "source": self.sch},
+            {"format": "svg", "source_type": "sch", "source": "project lasts x"},
+        ]
+        br = self.make_renderer(max_workers=1)
+        results = br.render(items, 1.8)
+        self.assertEqual(results[0]["data"], pipeline.render_svg(self.sch, "sch").decode())
+        self.assertIn("error", results[1])
+
+    def test_broken_pool(self):
+        items = [
+            {"format": "svg", "source_type": "sch", "source": self.sch},
+            {"format": "png", "source_type": "sch", "source": self.sch},
+        ]
+        br = self.make_renderer(max_workers=1)
+        try:
+            with patch("schedaus.pipeline.render_svg", _die):
+                results = br.render(items, 1.8)
+            self.assertEqual(len(results), 2)
+            self.assertTrue(all("error" in result for result in results))
+
+            results = br.render(items, 1.8)
+            self.assertEqual(results[0]["data"], pipeline.render_svg(self.sch, "sch").decode())
+            self.assertEqual(results[1]["format"], "png")
+        finally:
+            br.pool.shutdown()
+
+    def test_validate(self):
+        br = self.make_renderer()
+        item = {"format": "svg", "source_type": "sch", "source": ""}
+        cases = [
+            None,
+            {},
+            [item] * 11,
+            ["x"],
+            [dict(item, format="pdf")],
+            [dict(item, source_type="json")],
+            [dict(item, source=1)],
+        ]
+        for case in cases:
+            with self.subTest(items=case):
+                with self.assertRaises(BatchError):
+                    br.render(case, 1.8)
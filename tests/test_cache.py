@@ -1,8 +1,17 @@
+import os
+import copy
 import unittest
+import tempfile
+import multiprocessing
 from unittest.mock import patch, Mock
-from datetime import datetime
+from datetime import datetime, date
 
-from schedaus.cache import ResponseCache
+from schedaus import pipeline
+from schedaus.cache import ResponseCache, RenderCache, ModelCache, DiskModelCache, CalendarCache, MmapBackend, create_backend
+from schedaus.model import dump_model, load_model
+from schedaus.normalize import Normalizer
+from schedaus.proc import Resolver
+from tests.data import example_yaml, make_lattice, make_schedules
 
 
 class TestResponseCache(unittest.TestCase):
@@ -35,3 +44,269 @@ class TestResponseCache(unittest.TestCase):
         with patch('schedaus.cache.datetime', Mock(now=lambda: datetime(1970, 1, 1, 1, 0, 0))):
             value = cache.get("key")
             self.assertIsNotNone(value)
+
+    def test_cache_evict_least_recently_used(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+
+        self.assertEqual(cache.get("a"), b"1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"3")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_cache_evict_by_bytes(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.set("a", b"123456")
+        cache.set("b", b"123456")
+        cache.set("b", b"1234")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), b"1234")
+        self.assertEqual(cache.stats()["bytes"], 4)
+
+    def test_cache_expired_entries_are_dropped(self):
+        cache = ResponseCache()
+
+        with patch('schedaus.cache.datetime', Mock(now=lambda: datetime(1970, 1, 1, 0, 0, 0))):
+            cache.set("a", b"1")
+            cache.set("b", b"2")
+
+        with patch('schedaus.cache.datetime', Mock(now=lambda: datetime(1970, 1, 1, 1, 0, 0))):
+            cache.set("c", b"3")
+
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["bytes"], 1)
+        self.assertEqual(stats["expirations"], 2)
+
+
+def _set_in_child(kind, path, key, value):
+    cache = ResponseCache(backend=create_backend(kind, path))
+    cache.set(key, value)
+
+
+class TestResponseCacheBackends(unittest.TestCase):
+    kinds = ["memory", "mmap", "sqlite"]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _cache(self, kind, **kwargs):
+        path = os.path.join(self.tmpdir.name, f"cache.{kind}")
+        return ResponseCache(backend=create_backend(kind, path, **kwargs))
+
+    def test_set_get(self):
+        for kind in self.kinds:
+            with self.subTest(kind=kind):
+                cache = self._cache(kind)
+                cache.set("a", b"<svg>a</svg>")
+                cache.set("b", b"<svg>b</svg>")
+                cache.set("a", b"<svg>A</svg>")
+
+                self.assertEqual(cache.get("a"), b"<svg>A</svg>")
+                self.assertEqual(cache.get("b"), b"<svg>b</svg>")
+                self.assertIsNone(cache.get("c"))
+                self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_expired(self):
+        for kind in self.kinds:
+            with self.subTest(kind=kind):
+                cache = self._cache(kind)
+
+                with patch('schedaus.cache.datetime', Mock(now=lambda: datetime(2020, 1, 1, 0, 0, 0))):
+                    cache.set("key", b"value")
+
+                with patch('schedaus.cache.datetime', Mock(now=lambda: datetime(2020, 1, 1, 0, 3, 0))):
+                    self.assertEqual(cache.get("key"), b"value")
+
+                with patch('schedaus.cache.datetime', Mock(now=lambda: datetime(2020, 1, 1, 1, 0, 0))):
+                    self.assertIsNone(cache.get("key"))
+
+    def test_limits(self):
+        for kind in self.kinds:
+            with self.subTest(kind=kind):
+                cache = self._cache(kind, max_entries=2, max_bytes=128)
+                with self.assertLogs("schedaus.cache", "WARNING") as cm:
+                    cache.set("large", b"x" * 256)
+                    cache.set("large", b"x" * 512)
+                self.assertEqual(len(cm.output), 1)
+                self.assertIsNone(cache.get("large"))
+                self.assertEqual(cache.stats()["rejected"], 2)
+
+                for i in range(10):
+                    cache.set(f"key{i}", b"value")
+                self.assertLessEqual(cache.stats()["entries"], 2)
+                self.assertEqual(cache.get("key9"), b"value")
+
+    def test_shared_across_processes(self):
+        ctx = multiprocessing.get_context("fork")
+        for kind in ["mmap", "sqlite"]:
+            with self.subTest(kind=kind):
+                path = os.path.join(self.tmpdir.name, f"shared.{kind}")
+                cache = ResponseCache(backend=create_backend(kind, path))
+                cache.get("key")
+
+                p = ctx.Process(target=_set_in_child, args=(kind, path, "key", b"from child"))
+                p.start()
+                p.join()
+
+                self.assertEqual(cache.get("key"), b"from child")
+
+    def test_mmap_slot_bytes(self):
+        path = os.path.join(self.tmpdir.name, "cache.mmap")
+        cache = ResponseCache(backend=create_backend("mmap", path, max_entries=4, max_bytes=4 * 1024, slot_bytes=64 * 1024))
+        cache.set("large", b"x" * 32 * 1024)
+        self.assertEqual(cache.get("large"), b"x" * 32 * 1024)
+        self.assertEqual(cache.stats()["rejected"], 0)
+        self.assertEqual(os.path.getsize(path), 4 * 64 * 1024)
+
+    def test_mmap_size_mismatch(self):
+        path = os.path.join(self.tmpdir.name, "cache.mmap")
+        cache = ResponseCache(backend=MmapBackend(path, slots=4, slot_bytes=1024))
+        cache.set("key", b"value")
+
+        other = ResponseCache(backend=MmapBackend(path, slots=8, slot_bytes=1024))
+        with self.assertRaisesRegex(Exception, "remove it or use the same settings"):
+            other.get("key")
+        # the file and its entries are left as they were
+        self.assertEqual(os.path.getsize(path), 4 * 1024)
+        self.assertEqual(cache.get("key"), b"value")
+        self.assertEqual(ResponseCache(backend=MmapBackend(path, slots=4, slot_bytes=1024)).get("key"), b"value")
+
+
+class TestRenderCache(unittest.TestCase):
+    def test_make_key(self):
+        self.assertEqual(RenderCache.make_key("sch", "a", "svg"), RenderCache.make_key("sch", "a", "svg"))
+        self.assertNotEqual(RenderCache.make_key("sch", "a", "svg"), RenderCache.make_key("sch", "a", "png", 1.8))
+        self.assertNotEqual(RenderCache.make_key("sch", "a", "png", 1.8), RenderCache.make_key("sch", "a", "png", 2.0))
+        self.assertNotEqual(RenderCache.make_key("sch", "ab", "svg"), RenderCache.make_key("sch", "a", "bsvg"))
+
+    def test_make_etag(self):
+        etag = RenderCache.make_etag("sch", "a", "svg")
+        self.assertEqual(RenderCache.make_etag("sch", "a", "svg"), etag)
+        # a new version renders another output
+        with patch("schedaus.cache.__version__", "0.1"):
+            self.assertNotEqual(RenderCache.make_etag("sch", "a", "svg"), etag)
+
+    def test_evict_least_recently_used(self):
+        cache = RenderCache(max_entries=2)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+
+        self.assertEqual(cache.get("a"), b"1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"3")
+        self.assertEqual(cache.stats(), {"entries": 2, "bytes": 2, "hits": 3, "misses": 1})
+
+    def test_evict_by_bytes(self):
+        cache = RenderCache(max_bytes=10)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        cache.set("c", b"123")
+        cache.set("d", b"12345678901")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), b"12345")
+        self.assertEqual(cache.get("c"), b"123")
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.stats()["bytes"], 8)
+
+
+class TestModelCache(unittest.TestCase):
+    def test_resolve_cached(self):
+        cache = ModelCache(max_entries=1)
+        model = pipeline.resolve_cached(example_yaml, "yaml", cache)
+        self.assertIs(pipeline.resolve_cached(example_yaml, "yaml", cache), model)
+        self.assertEqual(model, pipeline.resolve(example_yaml, "yaml"))
+
+        other = pipeline.resolve_cached(example_yaml + "\n", "yaml", cache)
+        self.assertIsNot(other, model)
+        self.assertEqual(cache.stats(), {"entries": 1, "bytes": 1, "hits": 1, "misses": 2})
+
+
+class TestDiskModelCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.model = pipeline.resolve(example_yaml, "yaml")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_dump_load(self):
+        def _resolve(data):
+            Normalizer().normalize(data)
+            return Resolver().resolve(data)
+
+        for name, model in [
+            ("example", self.model),
+            ("lattice", _resolve(make_lattice(4, 6))),
+            ("schedules", _resolve(make_schedules(30))),
+        ]:
+            with self.subTest(model=name):
+                self.assertEqual(load_model(dump_model(model)), model)
+
+    def test_set_get(self):
+        cache = DiskModelCache(self.tmpdir.name)
+        cache.set("a", self.model)
+        self.assertEqual(cache.get("a"), self.model)
+        self.assertIsNone(cache.get("b"))
+        # another worker reads the same file
+        self.assertEqual(DiskModelCache(self.tmpdir.name).get("a"), self.model)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_version(self):
+        cache = DiskModelCache(self.tmpdir.name)
+        cache.set("a", self.model)
+        with patch("schedaus.cache.__version__", "0.0"):
+            self.assertIsNone(cache.get("a"))
+
+    def test_limits(self):
+        cache = DiskModelCache(self.tmpdir.name, max_entries=2)
+        for key in ["a", "b", "c"]:
+            cache.set(key, self.model)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_errors(self):
+        cache = DiskModelCache(self.tmpdir.name)
+        # a text yaml parsed into a date can not be stored
+        task = copy.copy(self.model["schedules"][0])
+        task.text = date(2020, 4, 1)
+        schedules = [task] + self.model["schedules"][1:]
+        cache.set("a", dict(self.model, schedules=schedules))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+        cache.set("b", self.model)
+        cache._conn().execute("UPDATE model_cache SET value = ?", (b"broken",))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertEqual(cache.stats()["errors"], 2)
+
+    def test_model_cache(self):
+        disk = DiskModelCache(self.tmpdir.name)
+        model = pipeline.resolve_cached(example_yaml, "yaml", ModelCache(disk=disk))
+        self.assertEqual(disk.stats()["entries"], 1)
+
+        # a new worker's memory cache is filled from the disk
+        cache = ModelCache(disk=DiskModelCache(self.tmpdir.name))
+        self.assertEqual(pipeline.resolve_cached(example_yaml, "yaml", cache), model)
+        self.assertEqual(cache.stats()["disk"]["hits"], 1)
+        pipeline.resolve_cached(example_yaml, "yaml", cache)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+
+class TestCalendarCache(unittest.TestCase):
+    def test_height_of(self):
+        cache = CalendarCache(height_step=512)
+        self.assertEqual([cache.height_of(h) for h in [1, 400, 512, 513]], [512, 512, 512, 1024])
+        self.assertEqual(CalendarCache(height_step=0).height_of(400), 400)
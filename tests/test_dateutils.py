@@ -1,7 +1,15 @@
 import unittest
-from datetime import date
+from datetime import date, timedelta
 
-from schedaus.utils import strpdate, weekday_to_dates, calc_date_in_business_days, calc_remain_days_in_month
+from schedaus.utils import (
+    strpdate,
+    weekday_to_dates,
+    calc_date_in_business_days,
+    calc_business_days,
+    calc_remain_days_in_month,
+    ClosedDays,
+    BusinessCalendar,
+)
 
 
 class TestDateutils(unittest.TestCase):
@@ -50,6 +58,75 @@ class TestDateutils(unittest.TestCase):
                 actual = weekday_to_dates(*case[0:3])
                 self.assertEqual(actual, case[3])
 
+    def test_weekday_to_dates_long(self):
+        start = date(2015, 3, 7)
+        end = date(2025, 11, 2)
+        for weekday in ["Monday", "Thursday", "Saturday", "Sunday"]:
+            with self.subTest(weekday=weekday):
+                expected = []
+                d = start
+                while d <= end:
+                    if d.strftime("%A") == weekday:
+                        expected.append(d)
+                    d += timedelta(days=1)
+                self.assertEqual(weekday_to_dates(weekday, start, end), expected)
+
+    def test_closed_days(self):
+        closed = ClosedDays()
+        closed.add_weekday("Saturday")
+        closed.add_weekday("Sunday")
+        closed.add_weekday("XXX")
+        closed.add_date(date(2020, 5, 1))
+        closed.add_range(date(2020, 4, 29), date(2020, 5, 6))
+        closed.add_range(date(2020, 5, 8), date(2020, 5, 7))
+
+        self.assertIn(date(2020, 4, 4), closed)
+        self.assertIn(date(2030, 1, 5), closed)
+        self.assertIn(date(2020, 5, 4), closed)
+        self.assertNotIn(date(2020, 4, 28), closed)
+        self.assertNotIn(date(2020, 5, 7), closed)
+        self.assertNotIn(date(2020, 5, 8), closed)
+
+        start = date(2020, 4, 1)
+        end = date(2020, 5, 15)
+        expected = sorted(set(
+            weekday_to_dates("Saturday", start, end)
+            + weekday_to_dates("Sunday", start, end)
+            + [date(2020, 4, 29) + timedelta(days=i) for i in range(8)]
+        ))
+        self.assertEqual(closed.dates(start, end), expected)
+        self.assertEqual(closed.dates(date(2020, 4, 29), date(2020, 4, 30)), [date(2020, 4, 29), date(2020, 4, 30)])
+
+    def test_closed_ranges(self):
+        closed = ClosedDays()
+        closed.add_range(date(2020, 6, 1), date(2020, 6, 10))
+        closed.add_range(date(2020, 4, 1), date(2020, 4, 10))
+        closed.add_range(date(2020, 4, 11), date(2020, 4, 15))
+        closed.add_range(date(2020, 4, 5), date(2020, 4, 12))
+        closed.add_range(date(2020, 1, 1), date(2119, 12, 31))
+        closed.add_range(date(2200, 1, 1), date(2200, 1, 1))
+        # merged, and each range is kept as its first and last days
+        self.assertEqual(len(closed.range_starts), 2)
+
+        closed = ClosedDays()
+        closed.add_range(date(2020, 6, 1), date(2020, 6, 10))
+        closed.add_range(date(2020, 4, 1), date(2020, 4, 10))
+        closed.add_range(date(2020, 4, 12), date(2020, 4, 15))
+        closed.add_range(date(2020, 4, 5), date(2020, 4, 8))
+        self.assertEqual(len(closed.range_starts), 3)
+        expected = (
+            [date(2020, 4, 1) + timedelta(days=i) for i in range(10)]
+            + [date(2020, 4, 12) + timedelta(days=i) for i in range(4)]
+            + [date(2020, 6, 1) + timedelta(days=i) for i in range(10)]
+        )
+        d = date(2020, 3, 1)
+        while d < date(2020, 7, 1):
+            self.assertEqual(d in closed, d in expected, d)
+            d += timedelta(days=1)
+        self.assertEqual(closed.dates(date(2020, 3, 1), date(2020, 7, 1)), expected)
+        self.assertEqual(closed.dates(date(2020, 4, 9), date(2020, 4, 12)), [date(2020, 4, 9), date(2020, 4, 10), date(2020, 4, 12)])
+        self.assertEqual(closed.dates(date(2020, 4, 20), date(2020, 5, 20)), [])
+
     def test_calc_date_in_business_days(self):
         cases = [
             (date(2020, 4, 1), 10, [], date(2020, 4, 10)),
@@ -69,6 +146,42 @@ class TestDateutils(unittest.TestCase):
                 actual = calc_date_in_business_days(*case[0:3])
                 self.assertEqual(actual, case[3])
 
+    def test_business_calendar(self):
+        start = date(2020, 4, 1)
+        end = date(2020, 4, 30)
+        closed = weekday_to_dates("Saturday", start, end) + weekday_to_dates("Sunday", start, end)
+        closed += [date(2020, 4, 1), date(2020, 4, 29), date(2020, 5, 1)]
+        cal = BusinessCalendar(start, end, closed)
+
+        for offset in range(-3, 34):
+            d = start + timedelta(days=offset)
+            for days in [0, 0.5, 1, 1.5, 2, 3, 7, 15, 25, -1, -2, -5, -15, -25]:
+                with self.subTest(start=d, days=days):
+                    expected = calc_date_in_business_days(d, days, closed)
+                    self.assertEqual(cal.date_in_business_days(d, days), expected)
+
+            for length in [0, 1, 6, 20, 40]:
+                e = d + timedelta(days=length)
+                with self.subTest(start=d, end=e):
+                    self.assertEqual(cal.business_days(d, e), calc_business_days(d, e, closed))
+
+    def test_business_calendar_closed_days(self):
+        start = date(2020, 4, 1)
+        end = date(2020, 6, 30)
+        closed_days = ClosedDays()
+        closed_days.add_weekday("Saturday")
+        closed_days.add_weekday("Sunday")
+        closed_days.add_range(date(2020, 4, 29), date(2020, 5, 6))
+        closed = closed_days.dates(date(2020, 1, 1), date(2020, 12, 31))
+        cal = BusinessCalendar(start, end, closed_days)
+
+        for offset in range(-3, 95, 4):
+            d = start + timedelta(days=offset)
+            for days in [1, 2, 7, 15, 40, -2, -15, -40]:
+                with self.subTest(start=d, days=days):
+                    expected = calc_date_in_business_days(d, days, closed)
+                    self.assertEqual(cal.date_in_business_days(d, days), expected)
+
     def test_calc_remain_days_in_month(self):
         cases = [
             (date(2020, 4, 1), 30),
@@ -0,0 +1,52 @@
+import unittest
+
+from schedaus.depgraph import DependencyGraph, CycleError
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def _graph(self, nodes, edges):
+        g = DependencyGraph()
+        for n in nodes:
+            g.add_node(n)
+        for src, dst in edges:
+            g.add_edge(src, dst)
+        return g
+
+    def test_topological_order(self):
+        g = self._graph(["d", "c", "b", "a", "x"], [("a", "b"), ("a", "c"), ("b", "d"), ("c", "d"), ("a", "c")])
+        order = g.topological_order()
+
+        self.assertEqual(sorted(order), ["a", "b", "c", "d", "x"])
+        for src, dst in [("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")]:
+            with self.subTest(edge=(src, dst)):
+                self.assertLess(order.index(src), order.index(dst))
+
+    def test_components(self):
+        g = self._graph(["a", "b", "c", "d", "e", "f"], [("c", "a"), ("d", "e"), ("b", "a"), ("f", "f")])
+        self.assertEqual(g.components(), [["a", "b", "c"], ["d", "e"], ["f"]])
+        self.assertEqual(self._graph([], []).components(), [])
+
+    def test_descendants(self):
+        g = self._graph(["a", "b", "c", "d", "e"], [("a", "b"), ("b", "c"), ("d", "c"), ("c", "e")])
+        self.assertEqual(g.descendants(["b"]), {"b", "c", "e"})
+        self.assertEqual(g.descendants(["a", "d"]), {"a", "b", "c", "d", "e"})
+        self.assertEqual(g.descendants(["e", "x"]), {"e"})
+        self.assertEqual(g.descendants([]), set())
+
+    def test_cycle_members(self):
+        cases = [
+            (["a"], [("a", "a")], ["a"]),
+            (["a", "b"], [("a", "b"), ("b", "a")], ["a", "b"]),
+            (["r", "a", "b", "c", "d"], [("r", "a"), ("a", "b"), ("b", "c"), ("c", "a"), ("c", "d")], ["a", "b", "c"]),
+        ]
+
+        for nodes, edges, expected in cases:
+            with self.subTest(edges=edges):
+                g = self._graph(nodes, edges)
+                with self.assertRaises(CycleError) as cm:
+                    g.topological_order()
+                cycle = cm.exception.cycle
+                self.assertEqual(sorted(cycle), expected)
+                # the members are reported in the order of the edges
+                for i, n in enumerate(cycle):
+                    self.assertIn((n, cycle[(i + 1) % len(cycle)]), edges)
@@ -0,0 +1,62 @@
+import copy
+import pickle
+import unittest
+from dataclasses import FrozenInstanceError
+from datetime import date
+
+from schedaus.model import Task, Milestone, DependencyPath, Group
+
+
+class TestModel(unittest.TestCase):
+    def _task(self, name="task1", text="Task 1", **kwargs):
+        return Task(name, text, date(2020, 4, 1), date(2020, 4, 6), "yellowgreen", "green", "blueviolet", "darkviolet", "black", **kwargs)
+
+    def test_attributes(self):
+        task = self._task(actual_start=date(2020, 4, 2), actual_progress=0.5)
+        self.assertEqual(task.plan_start, date(2020, 4, 1))
+        self.assertEqual(task.plan_end, date(2020, 4, 6))
+        self.assertEqual(task.actual_start, date(2020, 4, 2))
+        self.assertIsNone(task.actual_end)
+        self.assertEqual(task.actual_progress, 0.5)
+        self.assertEqual(task.color_actual_outline, "darkviolet")
+        self.assertFalse(hasattr(task, "__dict__"))
+
+        task.plan_end = date(2020, 4, 8)
+        task.color_text = "red"
+        self.assertEqual(task.plan_end, date(2020, 4, 8))
+        self.assertEqual((task.color_plan_fill, task.color_text), ("yellowgreen", "red"))
+        # a date which is not resolved stays as it is
+        self.assertEqual(self._task(actual_end="task2's end").actual_end, "task2's end")
+
+    def test_shared(self):
+        a = self._task("a")
+        b = self._task("b")
+        self.assertIs(a._colors, b._colors)
+        self.assertIs(a._plan_start, b._plan_start)
+        self.assertIs(a.text, self._task("c", text="".join(["Task", " 1"])).text)
+
+    def test_eq_repr(self):
+        self.assertEqual(self._task(), self._task())
+        self.assertNotEqual(self._task(), self._task(assignee="bob"))
+        self.assertNotEqual(self._task(), Milestone("task1", "Task 1", date(2020, 4, 1), "a", "b", "c", "d", "e"))
+        self.assertEqual(Group("g", ["a"]), Group("g", ["a"]))
+        self.assertTrue(repr(self._task()).startswith("Task(name='task1', text='Task 1', plan_start=datetime.date(2020, 4, 1), "))
+
+        dpath = DependencyPath("a", date(2020, 4, 1), "b", date(2020, 4, 3), "blue")
+        self.assertEqual(len({dpath, DependencyPath("a", date(2020, 4, 1), "b", date(2020, 4, 3), "blue")}), 1)
+
+    def test_frozen(self):
+        dpath = DependencyPath("a", date(2020, 4, 1), "b", date(2020, 4, 3), "blue")
+        for name, value in [("end_name", "c"), ("end_date", date(2020, 4, 5)), ("_end_date", 0), ("other", 1)]:
+            with self.subTest(name=name):
+                with self.assertRaises(FrozenInstanceError):
+                    setattr(dpath, name, value)
+        with self.assertRaises(AttributeError):
+            del dpath.color
+        self.assertEqual(dpath, DependencyPath("a", date(2020, 4, 1), "b", date(2020, 4, 3), "blue"))
+
+    def test_copy(self):
+        for obj in [self._task(actual_end=date(2020, 4, 9)), DependencyPath("a", date(2020, 4, 1), "b", date(2020, 4, 3), "blue")]:
+            with self.subTest(obj=obj):
+                self.assertEqual(pickle.loads(pickle.dumps(obj)), obj)
+                self.assertEqual(copy.deepcopy(obj), obj)
@@ -1,4 +1,5 @@
 import unittest
+from datetime import date
 
 from schedaus.normalize import Normalizer
 
@@ -11,6 +12,31 @@ class TestNormalize(unittest.TestCase):
 
         self.assertEqual(d["project"]["closed"], ["Sunday", "Saturday", "Wednesday", "Monday"])
 
+    def test_normalize_dates(self):
+        d = {
+            "project": {"start": "2020/4/1", "end": "2020/5/15", "today": "2020/4/20", "closed": ["sat", "2020/5/1"]},
+            "task": [{"plan": {"start": "2020/4/1", "end": "TK1's end"}, "actual": {"start": "2020/4/2", "end": "2020/4/3"}}],
+            "milestone": [{"plan": "2020/4/10", "actual": date(2020, 4, 11)}],
+        }
+        n = Normalizer()
+        n.normalize(d)
+
+        self.assertEqual(d["project"]["start"], date(2020, 4, 1))
+        self.assertEqual(d["project"]["end"], date(2020, 5, 15))
+        self.assertEqual(d["project"]["today"], date(2020, 4, 20))
+        self.assertEqual(d["project"]["closed"], ["Saturday", date(2020, 5, 1)])
+        self.assertEqual(d["task"][0]["plan"], {"start": date(2020, 4, 1), "end": "TK1's end"})
+        self.assertEqual(d["task"][0]["actual"], {"start": date(2020, 4, 2), "end": date(2020, 4, 3)})
+        self.assertEqual(d["milestone"][0]["plan"], date(2020, 4, 10))
+        self.assertEqual(d["milestone"][0]["actual"], date(2020, 4, 11))
+
+    def test_normalize_closed_range(self):
+        d = {"project": {"closed": ["2020/4/29 to 2020/5/6", "2020/4/29 to xxx"]}}
+        n = Normalizer()
+        n.normalize(d)
+
+        self.assertEqual(d["project"]["closed"], [(date(2020, 4, 29), date(2020, 5, 6)), "2020/4/29 to xxx"])
+
     def test_normalize_period_in_task_plan(self):
         cases = [
             (1, 1),
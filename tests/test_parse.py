@@ -0,0 +1,152 @@
+import unittest
+
+from schedaus.parse import Parser, IncrementalParser
+from tests.data import make_sch
+
+
+class LinearParser(Parser):
+    """Parser trying every pattern in order, as the dispatcher did before the table."""
+
+    def match(self, line):
+        for pattern, handler in self.dispatch_table["any"]:
+            m = pattern.match(line)
+            if m is not None:
+                return handler, m
+        return None, None
+
+
+class TestParse(unittest.TestCase):
+    def test_dispatch_table(self):
+        lines = [
+            "",
+            "# comment",
+            "project lasts 2020/4/1 to 2020/5/31",
+            "Project lasts 2020/4/1 to 2020/5/31",
+            "2020/4/29 to 2020/5/6 are closed",
+            "saturday are closed",
+            "today is 2020/4/20",
+            "scale is weekly",
+            "tasks are colored #f00/#0f0",
+            "-- group --",
+            "== group ==",
+            "task1: \"Task 1\"",
+            "task2",
+            "!ms1: milestone",
+            "  >> 2020/4/1",
+            "  @alice",
+            "\t>> 2020/4/1",
+            ":",
+            "!",
+        ]
+        def _match(parser, line):
+            handler, m = parser.match(line)
+            return handler, m and m.groups()
+
+        for line in lines:
+            with self.subTest(line=line):
+                self.assertEqual(_match(Parser(), line), _match(LinearParser(), line))
+
+    def test_parse_same_as_linear(self):
+        with open("example/example.sch") as f:
+            example = f.read()
+        for source in [example, make_sch(200)]:
+            p1 = Parser()
+            p1.parse(source)
+            p2 = LinearParser()
+            p2.parse(source)
+            self.assertEqual(p1.output, p2.output)
+
+    def test_ranged_holiday(self):
+        p = Parser()
+        p.parse("2020/4/29 to 2020/5/6 are closed\n2020/5/8 to 2020/5/7 are closed\nxxx to 2020/5/7 are closed\n")
+        self.assertEqual(p.output["project"]["closed"], ["2020/4/29 to 2020/5/6"])
+
+    def test_duplicated_name(self):
+        sources = [
+            "task1: a\n  >> 2020/4/1\n  >= 2 days\ntask1: b\n  >> 2020/4/1\n  >= 2 days\n",
+            "task1: a\n  >> 2020/4/1\n  >= 2 days\n!task1: b\n  >! 2020/4/1\n",
+        ]
+        for source in sources:
+            with self.subTest(source=source):
+                with self.assertRaisesRegex(Exception, "'task1' is duplicated."):
+                    Parser().parse(source)
+
+    def test_registered_once(self):
+        p = Parser()
+        p.parse("-- g --\ntask1: a\n  >> 2020/4/1\n  >= 2 days\n  @alice\n  .> 2020/4/1\n")
+        self.assertEqual([t["name"] for t in p.output["task"]], ["task1"])
+        self.assertEqual(p.output["group"][0]["member"], ["task1"])
+        self.assertEqual(p.output["task"][0]["assignee"], "alice")
+        self.assertEqual(p.names, {"task1": "task"})
+
+    def test_feed(self):
+        with open("example/example.sch") as f:
+            source = f.read()
+        p1 = Parser()
+        p1.parse(source)
+
+        p2 = Parser()
+        p2.parse_file("example/example.sch")
+        self.assertEqual(p1.output, p2.output)
+
+        p3 = Parser()
+        lines = source.splitlines(keepends=True)
+        p3.feed(line for line in lines[:10])
+        p3.feed(iter(lines[10:]))
+        p3.close()
+        self.assertEqual(p1.output, p3.output)
+
+
+class TestIncrementalParse(unittest.TestCase):
+    def setUp(self):
+        with open("example/example.sch") as f:
+            self.lines = f.read().splitlines()
+
+    def assertSameOutput(self, ip, lines):
+        p = Parser()
+        p.parse("\n".join(lines))
+        self.assertEqual(ip.lines, lines)
+        self.assertEqual(ip.get_output(), p.output)
+
+    def test_parse(self):
+        ip = IncrementalParser("\n".join(self.lines))
+        self.assertSameOutput(ip, self.lines)
+
+    def test_update(self):
+        edits = [
+            # an attribute of task2
+            (self.lines.index("  @bob"), self.lines.index("  @bob") + 1, ["  @carol"]),
+            # a new task at the end of the group
+            (len(self.lines), len(self.lines), ["task9", "  >> 2020/4/1", "  >= 3 days"]),
+            # an attribute appended to the last task
+            (len(self.lines), len(self.lines), ["  @dave"]),
+            # remove the header of TK2, its attributes go to TK1
+            (self.lines.index("TK2"), self.lines.index("TK2") + 1, []),
+            # a new group in the middle of a task
+            (self.lines.index("  .= 5 days"), self.lines.index("  .= 5 days"), ["-- Later --"]),
+            # project lines
+            (0, 1, ["project lasts 2020/4/1 to 2020/6/30", "2020/5/4 to 2020/5/6 are closed"]),
+        ]
+        ip = IncrementalParser("\n".join(self.lines))
+        lines = list(self.lines)
+        for start, end, new in edits:
+            with self.subTest(start=start, end=end, new=new):
+                ip.update(start, end, new)
+                lines[start:end] = new
+                self.assertSameOutput(ip, lines)
+
+    def test_update_reparses_touched_blocks(self):
+        ip = IncrementalParser("\n".join(self.lines))
+        before = list(ip.blocks)
+        i = self.lines.index("  @bob")
+        ip.update(i, i + 1, ["  @carol"])
+        changed = [b for b in ip.blocks if all(b is not o for o in before)]
+        self.assertEqual(len(ip.blocks), len(before))
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(changed[0].lines[0], "task2: 'Task 2'")
+
+    def test_duplicated_name(self):
+        ip = IncrementalParser("\n".join(self.lines))
+        ip.update(len(self.lines), len(self.lines), ["TK1", "  >> 2020/4/1", "  >= 3 days"])
+        with self.assertRaisesRegex(Exception, "'TK1' is duplicated."):
+            ip.get_output()
@@ -1,10 +1,16 @@
+import os
+import copy
+import math
 import unittest
 import yaml
-from datetime import date
+from datetime import date, timedelta
+from unittest import mock
 
 from schedaus.normalize import Normalizer
-from schedaus.proc import Resolver
-from tests.data import example_yaml
+from schedaus.proc import Resolver, ResolvePool
+from schedaus.depgraph import CycleError
+from schedaus.utils import ClosedDays, BusinessCalendar
+from tests.data import example_yaml, make_lattice, make_projects
 
 
 class TestProc(unittest.TestCase):
@@ -41,6 +47,145 @@ class TestProc(unittest.TestCase):
                 self.assertEqual(sc[name].plan_start, start)
                 self.assertEqual(sc[name].plan_end, end)
 
+    def test_dependency_paths(self):
+        paths = {(p.start_name, p.end_name) for p in self.result["dependency_paths"]}
+        expected = {
+            ("TK1", "TK2"),
+            ("task1", "task2"),
+            ("milestone1", "task2"),
+            ("task2", "task3"),
+            ("task2", "task4"),
+        }
+        self.assertEqual(paths, expected)
+        self.assertEqual(len(self.result["dependency_paths"]), len(expected))
+
+    def test_dependency_paths_to_milestone(self):
+        d = yaml.safe_load(example_yaml)
+        d["milestone"].append({"name": "milestone2", "text": "Release", "plan": "task3's end"})
+        d["task"].append({"name": "task6", "text": "Task 6", "plan": {"start": "task3's end", "end": "task3's end"}})
+        Normalizer().normalize(d)
+        result = Resolver().resolve(d)
+        paths = [(p.start_name, p.end_name) for p in result["dependency_paths"]]
+        self.assertEqual(paths.count(("task3", "milestone2")), 1)
+        self.assertEqual(paths.count(("task3", "task6")), 1)
+        self.assertEqual(len(set(result["dependency_paths"])), len(result["dependency_paths"]))
+
+
+class TestProcCycle(unittest.TestCase):
+    def test_looped_dependencies(self):
+        d = yaml.safe_load(example_yaml)
+        d["task"][0]["plan"]["start"] = "TK2's end"
+        n = Normalizer()
+        n.normalize(d)
+
+        with self.assertRaises(CycleError) as cm:
+            Resolver().resolve(d)
+        self.assertEqual(sorted(cm.exception.cycle), ["TK1", "TK2"])
+
+
+class TestProcLattice(unittest.TestCase):
+    def test_resolve_lattice(self):
+        width, depth = 20, 30
+        d = make_lattice(width, depth)
+        Normalizer().normalize(d)
+        result = Resolver().resolve(d)
+
+        self.assertEqual(len(result["schedules"]), width * depth)
+        # every dependency path is emitted exactly once
+        self.assertEqual(len(result["dependency_paths"]), width * (depth - 1) * 2)
+        self.assertEqual(len(set(result["dependency_paths"])), len(result["dependency_paths"]))
+
+
+def _die(*args):
+    os._exit(1)
+
+
+class TestProcParallel(unittest.TestCase):
+    def setUp(self):
+        self.pool = ResolvePool(0, max_workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def _resolve(self, data, resolver):
+        Normalizer().normalize(data)
+        return resolver.resolve(data)
+
+    def test_resolve_components_in_parallel(self):
+        for data in [lambda: make_projects(5, 4, 6), lambda: yaml.safe_load(example_yaml)]:
+            serial = self._resolve(data(), Resolver())
+            parallel = self._resolve(data(), Resolver(self.pool))
+            self.assertEqual(parallel, serial)
+
+    def test_below_threshold(self):
+        resolver = Resolver(ResolvePool(1000, max_workers=2))
+        with mock.patch.object(resolver, "_resolve_components") as resolve_components:
+            self._resolve(make_projects(5, 4, 6), resolver)
+        resolve_components.assert_not_called()
+
+    def test_broken_pool(self):
+        # a worker died, e.g. killed for its memory
+        data = make_projects(5, 4, 6)
+        serial = self._resolve(copy.deepcopy(data), Resolver())
+        with mock.patch("schedaus.proc._resolve_chunk", _die):
+            self.assertEqual(self._resolve(copy.deepcopy(data), Resolver(self.pool)), serial)
+        broken = self.pool.executor
+        self.assertEqual(self._resolve(copy.deepcopy(data), Resolver(self.pool)), serial)
+        self.assertIsNot(self.pool.executor, broken)
+
+
+class TestProcUpdate(unittest.TestCase):
+    def _normalized(self, data):
+        Normalizer().normalize(data)
+        return data
+
+    def test_update(self):
+        data = self._normalized(make_lattice(4, 6))
+        previous = Resolver().resolve(copy.deepcopy(data))
+
+        data["task"][9]["plan"] = {"start": "n2_0's end", "period": 5.0}
+        model, dirty = Resolver().update(copy.deepcopy(data), previous, {"n2_1"})
+        self.assertEqual(model, Resolver().resolve(copy.deepcopy(data)))
+        # n2_1 and the tasks depending on it
+        self.assertEqual(dirty, {"n2_1", "n3_0", "n3_1", "n4_0", "n4_1", "n4_3", "n5_0", "n5_1", "n5_2", "n5_3"})
+        # the other schedules are reused as they are
+        self.assertIs(model["schedules"][0], previous["schedules"][0])
+
+    def test_update_example(self):
+        data = self._normalized(yaml.safe_load(example_yaml))
+        previous = Resolver().resolve(copy.deepcopy(data))
+        data["milestone"][0]["plan"] = date(2020, 4, 14)
+        model, dirty = Resolver().update(copy.deepcopy(data), previous, {"milestone1"})
+        self.assertEqual(model, Resolver().resolve(copy.deepcopy(data)))
+        self.assertEqual(dirty, {"milestone1", "task2", "task3", "task4"})
+
+
+class TestProcActual(unittest.TestCase):
+    def test_progress(self):
+        closed = ClosedDays()
+        closed.add_weekday("Saturday")
+        closed.add_weekday("Sunday")
+        closed.add_date(date(2020, 5, 1))
+        resolver = Resolver()
+        resolver.business_calendar = BusinessCalendar(date(2020, 4, 1), date(2020, 6, 30), closed)
+        today = date(2020, 5, 20)
+
+        # the days from the start until yesterday, counted the way it used to be
+        def _expected_end(start, progress):
+            dates = set([start + timedelta(i) for i in range((today - start).days)])
+            dates = {d for d in dates if d not in closed}
+            return resolver.business_calendar.date_in_business_days(start, math.ceil(len(dates) / progress))
+
+        # starting before the project, in it, today and after today
+        for i in range(-40, 40, 3):
+            start = today + timedelta(days=i)
+            for progress in [0.05, 0.3, 1.0]:
+                with self.subTest(start=start, progress=progress):
+                    task = {"actual": {"start": start, "progress": progress}}
+                    resolver._resolve_actual({"today": today}, task)
+                    self.assertEqual(task["actual"]["end"], _expected_end(start, progress))
+                    self.assertEqual(task["actual"]["completed"], today)
+
 
 class TestProcUtils(unittest.TestCase):
     def test_get_colors(self):
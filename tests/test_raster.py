@@ -0,0 +1,66 @@
+import os
+import unittest
+import threading
+from unittest.mock import patch
+
+from schedaus.raster import Rasterizer, RasterizeError
+
+
+def _die(svg_bytes, scale):
+    # the worker is killed, e.g. for its memory
+    os._exit(1)
+
+
+def _png(svg_bytes, scale):
+    return b"png" + svg_bytes
+
+
+class TestRasterizer(unittest.TestCase):
+    def test_cache_by_svg_and_scale(self):
+        calls = []
+
+        def _svg_to_png(svg_bytes, scale):
+            calls.append((svg_bytes, scale))
+            return b"png" + svg_bytes
+
+        r = Rasterizer(max_workers=0)
+        with patch("schedaus.raster.svg_to_png", _svg_to_png):
+            self.assertEqual(r.to_png(b"<svg/>", 1.8), b"png<svg/>")
+            self.assertEqual(r.to_png(b"<svg/>", 1.8), b"png<svg/>")
+            self.assertEqual(r.to_png(b"<svg/>", 2.0), b"png<svg/>")
+            self.assertEqual(r.to_png(b"<svg></svg>", 1.8), b"png<svg></svg>")
+
+        self.assertEqual(calls, [(b"<svg/>", 1.8), (b"<svg/>", 2.0), (b"<svg></svg>", 1.8)])
+        self.assertEqual(r.stats()["hits"], 1)
+
+    def test_queue_depth(self):
+        started = threading.Event()
+        finish = threading.Event()
+
+        def _svg_to_png(svg_bytes, scale):
+            started.set()
+            finish.wait()
+            return b"png"
+
+        r = Rasterizer(max_workers=0, max_queue=1)
+        with patch("schedaus.raster.svg_to_png", _svg_to_png):
+            t = threading.Thread(target=r.to_png, args=(b"<svg>1</svg>", 1.8))
+            t.start()
+            started.wait()
+            with self.assertRaises(RasterizeError):
+                r.to_png(b"<svg>2</svg>", 1.8)
+            finish.set()
+            t.join()
+
+            self.assertEqual(r.to_png(b"<svg>2</svg>", 1.8), b"png")
+
+    def test_broken_pool(self):
+        r = Rasterizer(max_workers=1, max_queue=1)
+        try:
+            with patch("schedaus.raster.svg_to_png", _die):
+                with self.assertRaises(RasterizeError):
+                    r.to_png(b"<svg>1</svg>", 1.8)
+            with patch("schedaus.raster.svg_to_png", _png):
+                self.assertEqual(r.to_png(b"<svg>2</svg>", 1.8), b"png<svg>2</svg>")
+        finally:
+            r.pool.shutdown()
@@ -0,0 +1,223 @@
+import unittest
+from dataclasses import replace
+from datetime import date
+
+from schedaus import pipeline
+from schedaus.normalize import Normalizer
+from schedaus.proc import Resolver
+from schedaus.render import Renderer
+from schedaus.cache import CalendarCache
+from tests.data import example_yaml, make_lattice, make_sch
+
+
+class TestTextBackend(unittest.TestCase):
+    def _render(self, data, backend):
+        renderer = Renderer(backend=backend)
+        renderer.render(data)
+        return renderer.get_svg().tostring()
+
+    def test_same_as_svgwrite(self):
+        def _lattice():
+            d = make_lattice(4, 6)
+            Normalizer().normalize(d)
+            return Resolver().resolve(d)
+
+        cases = [
+            ("example", lambda: pipeline.resolve(example_yaml, "yaml")),
+            ("lattice", _lattice),
+        ]
+
+        for name, data in cases:
+            with self.subTest(data=name):
+                self.assertEqual(self._render(data(), "text"), self._render(data(), "svgwrite"))
+
+    def test_error_same_as_svgwrite(self):
+        svgs = []
+        for backend in ["svgwrite", "text"]:
+            try:
+                raise Exception("<error> & \"quoted\"\n  detail")
+            except Exception:
+                renderer = Renderer(backend=backend)
+                renderer.draw_error()
+                svgs.append(renderer.get_svg().tostring())
+                svgs.append(renderer.add_error(self._render(pipeline.resolve(example_yaml, "yaml"), backend)))
+
+        self.assertEqual(svgs[2], svgs[0])
+        self.assertEqual(svgs[3], svgs[1])
+
+    def test_escaped_ids(self):
+        # the names of the groups have spaces, which svgwrite refuses in an id
+        source = make_sch(150) + '\n-- (50%, done) --\ntask150: "Task 150"\n  >> 2020/4/1\n  >= 2 days\n'
+        svg = self._render(pipeline.resolve(source, "sch"), "svgwrite")
+        self.assertEqual(self._render(pipeline.resolve(source, "sch"), "text"), svg)
+        self.assertIn('id="group-Group%200"', svg)
+        self.assertIn('id="group-%2850%25%2C%20done%29"', svg)
+
+
+class TestWindow(unittest.TestCase):
+    def _render(self, window, backend="text"):
+        renderer = Renderer(backend=backend)
+        renderer.render(pipeline.resolve(example_yaml, "yaml"), window=window)
+        return renderer.get_svg().tostring()
+
+    def test_whole_project(self):
+        self.assertEqual(self._render((None, None)), self._render(None))
+        self.assertEqual(self._render((date(2020, 3, 1), date(2020, 6, 1))), self._render(None))
+
+    def test_window(self):
+        svg = self._render((date(2020, 4, 20), date(2020, 4, 30)))
+        whole = self._render(None)
+        self.assertIn(' width="176px"', svg)
+        # rows keep their places
+        self.assertIn(' height="400px"', svg)
+        self.assertIn(' height="400px"', whole)
+        # task1 (4/1 - 4/6) is out of the window, TK2 and task3 are in it
+        self.assertIn(">Task 1", whole)
+        self.assertNotIn(">Task 1", svg)
+        self.assertIn(">TK2<", svg)
+        self.assertIn(">Task 3@bob<", svg)
+        self.assertNotIn('id="path-task1-to-task2"', svg)
+        self.assertLess(len(svg), len(whole))
+        self.assertEqual(svg, self._render((date(2020, 4, 20), date(2020, 4, 30)), "svgwrite"))
+
+    def test_out_of_project(self):
+        with self.assertRaisesRegex(Exception, "out of the project"):
+            self._render((date(2021, 1, 1), None))
+
+
+class TestTile(unittest.TestCase):
+    def _tile(self, data, z, col, row, backend="text"):
+        renderer = Renderer(backend=backend)
+        renderer.render_tile(data, z, col, row)
+        return renderer.get_svg().tostring()
+
+    def test_tile(self):
+        data = pipeline.resolve(example_yaml, "yaml")
+        svg = self._tile(data, 0, 0, 0)
+        self.assertIn(' viewBox="0 0 512 512"', svg)
+        self.assertIn(' width="512px"', svg)
+        self.assertIn(' height="512px"', svg)
+        self.assertEqual(svg, self._tile(data, 0, 0, 0, "svgwrite"))
+        # the last column is cut at the project's end: 45 days - 32 days
+        self.assertIn(' width="208px"', self._tile(data, 0, 1, 0))
+        # weekly: 64 days per tile
+        self.assertIn(' width="360px"', self._tile(data, 1, 0, 0))
+
+    def test_rows(self):
+        d = make_lattice(4, 40)
+        Normalizer().normalize(d)
+        data = Resolver().resolve(d)
+        tiles = [self._tile(data, 0, 0, row) for row in range(10)]
+        for idx, sc in enumerate(data["schedules"]):
+            y = 16 * 4 + 32 * idx
+            if sc.plan_start >= date(2020, 5, 3):
+                continue
+            with self.subTest(schedule=sc.name):
+                found = [row for row, tile in enumerate(tiles) if f">{sc.name}<" in tile]
+                self.assertEqual(found, [y // 512])
+
+    def test_out_of_chart(self):
+        data = pipeline.resolve(example_yaml, "yaml")
+        for z, col, row in [(0, 2, 0), (0, 0, 1), (0, -1, 0), (3, 0, 0)]:
+            with self.subTest(tile=(z, col, row)):
+                with self.assertRaises(Exception):
+                    self._tile(data, z, col, row)
+
+
+class TestScale(unittest.TestCase):
+    def _render(self, scale, backend="text"):
+        data = pipeline.resolve(example_yaml.replace("today:", f"scale: {scale}\n  today:"), "yaml")
+        renderer = Renderer(backend=backend)
+        renderer.render(data)
+        return renderer.get_svg().tostring()
+
+    def test_closed_runs(self):
+        runs = Renderer._closed_runs([date(2020, 4, 4), date(2020, 4, 5), date(2020, 4, 11), date(2020, 4, 30), date(2020, 5, 1)])
+        self.assertEqual(runs, [[date(2020, 4, 4), 2], [date(2020, 4, 11), 1], [date(2020, 4, 30), 2]])
+
+    def test_daily(self):
+        svg = self._render("daily")
+        # the grid is one path, the lines left are today's line and the dependency paths
+        self.assertEqual(svg.count("<path "), 1)
+        self.assertEqual(svg.count('<line style="stroke:#C0C0C0'), 0)
+        self.assertIn(' d="M0,0V48 M0,48V400 M16,48V400 ', svg)
+        self.assertIn(' M720,0V400 M0,0H720 M0,48H720"', svg)
+        # the weekends, with 5/1 joining the one after it, are 6 runs of closed days
+        self.assertIn('<rect fill="#D0D0D0" height="384" width="32" x="48" y="16" />', svg)
+        self.assertEqual(svg.count('fill="#D0D0D0"'), 6)
+        self.assertEqual(svg, self._render("daily", "svgwrite"))
+
+    def test_weekly(self):
+        svg = self._render("weekly")
+        # a weekend is a rect, and 5/1 joins the weekend after it
+        self.assertIn('<rect fill="#D0D0D0" height="384" width="16" x="24" y="32" />', svg)
+        self.assertIn('<rect fill="#D0D0D0" height="384" width="24" x="240" y="32" />', svg)
+        self.assertEqual(svg.count('fill="#D0D0D0"'), 6)
+        # a day text per week
+        self.assertEqual(svg.count('font-size="11"'), 6)
+        self.assertEqual(svg, self._render("weekly", "svgwrite"))
+
+    def test_monthly(self):
+        svg = self._render("monthly")
+        self.assertIn(' width="90px"', svg)
+        self.assertIn(">2020/4<", svg)
+        self.assertIn(">2020/5<", svg)
+        self.assertEqual(svg.count('fill="#D0D0D0"'), 6)
+        self.assertEqual(svg, self._render("monthly", "svgwrite"))
+
+
+class TestCalendarCache(unittest.TestCase):
+    def _render(self, data, backend="text", calendar_cache=None):
+        renderer = Renderer(backend=backend, calendar_cache=calendar_cache)
+        renderer.render(data)
+        return renderer.get_svg().tostring()
+
+    def test_same_as_uncached(self):
+        cache = CalendarCache(height_step=0)
+        for scale in ["daily", "weekly", "monthly"]:
+            data = pipeline.resolve(example_yaml.replace("today:", f"scale: {scale}\n  today:"), "yaml")
+            for backend in ["text", "svgwrite"]:
+                with self.subTest(scale=scale, backend=backend):
+                    svg = self._render(data, backend)
+                    self.assertEqual(self._render(data, backend, cache), svg)
+                    self.assertEqual(self._render(data, backend, cache), svg)
+        # a layer per scale, drawn once and reused by the others
+        self.assertEqual(cache.stats()["entries"], 3)
+        self.assertEqual(cache.stats()["misses"], 3)
+        self.assertEqual(cache.stats()["hits"], 9)
+
+    def test_height_step(self):
+        cache = CalendarCache()
+        data = pipeline.resolve(example_yaml, "yaml")
+        svg = self._render(data, calendar_cache=cache)
+        # the chart keeps its height, the layer is drawn down to 512px
+        self.assertIn(' height="400px"', svg)
+        self.assertIn(' d="M0,0V48 M0,48V512 M16,48V512 ', svg)
+        self.assertIn('<rect fill="#D0D0D0" height="496" width="32" x="48" y="16" />', svg)
+        self.assertEqual(svg, self._render(data, "svgwrite", cache))
+
+        # a chart of a few more rows shares the layer
+        more = pipeline.resolve(example_yaml.replace("task:", "task:\n  - name: extra\n    plan:\n      start: 2020/4/1\n      end: 2020/4/2", 1), "yaml")
+        self.assertIn(' height="432px"', self._render(more, calendar_cache=cache))
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_key(self):
+        cache = CalendarCache()
+        data = pipeline.resolve(example_yaml, "yaml")
+        svg = self._render(data, calendar_cache=cache)
+        closed = [d for d in data["calendar"].closed if d != date(2020, 5, 1)]
+        other = self._render(dict(data, calendar=replace(data["calendar"], closed=closed)), calendar_cache=cache)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertNotEqual(other, svg)
+        self._render(data, calendar_cache=cache)
+        self._render(data, calendar_cache=cache)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_tile(self):
+        cache = CalendarCache()
+        data = pipeline.resolve(example_yaml, "yaml")
+        for col in [0, 1]:
+            renderer = Renderer(backend="text")
+            svg = renderer.render_tile(data, 0, col, 0).tostring()
+            cached = Renderer(backend="text", calendar_cache=cache)
+            self.assertEqual(cached.render_tile(data, 0, col, 0).tostring(), svg)
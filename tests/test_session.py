@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+
+from schedaus import pipeline
+from schedaus.cache import CalendarCache
+from schedaus.render import Renderer
+from schedaus.session import Session, SessionStore
+from tests.data import example_yaml
+
+
+class TestSession(unittest.TestCase):
+    def _full(self, source):
+        renderer = Renderer(backend="text")
+        renderer.render(pipeline.resolve(source, "yaml"))
+        return renderer.get_svg().tostring()
+
+    def _update(self, session, source):
+        # a client applying every response
+        svg, patch, revision = session.update(pipeline.load(source, "yaml"), session.revision)
+        self.assertEqual(revision, session.revision)
+        return svg, patch
+
+    def test_first_update(self):
+        for calendar_cache in [None, CalendarCache(height_step=0)]:
+            with self.subTest(calendar_cache=calendar_cache):
+                svg, patch = self._update(Session(calendar_cache), example_yaml)
+                self.assertIsNone(patch)
+                self.assertEqual(svg, self._full(example_yaml))
+
+    def test_changed_schedule(self):
+        session = Session()
+        self._update(session, example_yaml)
+        # task1 ends later, which moves the start of task2
+        edited = example_yaml.replace("period: 4 days", "period: 6 days", 1)
+        svg, patch = self._update(session, edited)
+        self.assertEqual(svg, self._full(edited))
+        self.assertEqual(patch["width"], "720px")
+        self.assertEqual(patch["height"], "400px")
+        self.assertEqual(sorted(patch["rows"]), ["schedule-task1", "schedule-task2"])
+        for id_, row in patch["rows"].items():
+            self.assertIn(row, svg)
+            self.assertTrue(row.startswith(f'<g id="{id_}" '))
+        self.assertIn("path-task1-to-task2", patch["remove"])
+        for path in patch["add"]:
+            self.assertIn(path, svg)
+
+        # back to the first source
+        svg, patch = self._update(session, example_yaml)
+        self.assertEqual(svg, self._full(example_yaml))
+
+    def test_unchanged(self):
+        session = Session()
+        first, _ = self._update(session, example_yaml)
+        svg, patch = self._update(session, example_yaml)
+        self.assertEqual(svg, first)
+        self.assertEqual(patch, {"width": "720px", "height": "400px", "rows": {}, "remove": [], "add": []})
+
+    def test_rendered_again(self):
+        session = Session()
+        self._update(session, example_yaml)
+        for edited in [
+            example_yaml.replace("today: 2020/4/20", "today: 2020/4/21"),
+            example_yaml.replace("member: [TK1, TK2]", "member: [TK2, TK1]"),
+            example_yaml.replace("  - name: task5", "  - name: task6"),
+        ]:
+            with self.subTest(edited=edited):
+                svg, patch = self._update(session, edited)
+                self.assertIsNone(patch)
+                self.assertEqual(svg, self._full(edited))
+
+    def test_error(self):
+        session = Session()
+        first, _ = self._update(session, example_yaml)
+        with self.assertRaises(Exception):
+            self._update(session, example_yaml.replace("start: 2020/4/10\n      period: 11 days", "start: TK2's end\n      period: 11 days"))
+        # the session is left as it was before the error
+        svg, patch = self._update(session, example_yaml)
+        self.assertEqual(svg, first)
+        self.assertEqual(patch["rows"], {})
+
+    def test_stale_revision(self):
+        session = Session()
+        first, _ = self._update(session, example_yaml)
+        first_revision = session.revision
+        edited = example_yaml.replace("period: 4 days", "period: 6 days", 1)
+        self._update(session, edited)
+        self.assertNotEqual(session.revision, first_revision)
+
+        # the client still has the first svg, e.g. the responses arrived out of order
+        edited_again = edited.replace("period: 6 days", "period: 7 days", 1)
+        for revision in [first_revision, None, "unknown"]:
+            with self.subTest(revision=revision):
+                svg, patch, _ = session.update(pipeline.load(edited_again, "yaml"), revision)
+                self.assertIsNone(patch)
+                self.assertEqual(svg, self._full(edited_again))
+
+        # the revision is the same for the same svg
+        svg, patch, revision = session.update(pipeline.load(example_yaml, "yaml"), session.revision)
+        self.assertEqual(svg, first)
+        self.assertEqual(revision, first_revision)
+        self.assertIsNotNone(patch)
+
+
+class TestSessionStore(unittest.TestCase):
+    def test_get(self):
+        store = SessionStore(max_entries=2)
+        a = store.get("a")
+        self.assertIs(store.get("a"), a)
+        store.get("b")
+        store.get("c")
+        self.assertEqual(store.stats(), {"entries": 2})
+        self.assertIsNot(store.get("a"), a)
+
+    def test_expire(self):
+        store = SessionStore(expire_min=5)
+        a = store.get("a")
+        later = datetime.now() + timedelta(minutes=6)
+        with patch("schedaus.session.datetime") as mock_datetime:
+            mock_datetime.now.return_value = later
+            self.assertIsNot(store.get("a"), a)
+            self.assertEqual(store.stats(), {"entries": 1})